@@ -1,21 +1,35 @@
 from aldryn_client import forms
 
+from djangocms_picture.conf import (
+    DEFAULT_ALIGNMENT,
+    DEFAULT_RATIO,
+    DEFAULT_RESPONSIVE_IMAGES_DENSITIES,
+    DEFAULT_RESPONSIVE_IMAGES_MODE,
+    DEFAULT_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS,
+)
+
 
 def split_and_strip(string):
     return [item.strip() for item in string.split(',') if item]
 
 
+def join(values):
+    return ', '.join(str(value) for value in values)
+
+
 class Form(forms.BaseForm):
     templates = forms.CharField(
         'List of additional templates (comma separated)',
         required=False,
     )
     alignment = forms.CharField(
-        'List of alignment types, default "left, center, right" (comma separated)',
+        'List of alignment types, default "{}" (comma separated)'.format(
+            join(key for key, label in DEFAULT_ALIGNMENT)
+        ),
         required=False,
     )
     ratio = forms.CharField(
-        'The ratio used to calculate the missing width or height, default "1.618"',
+        'The ratio used to calculate the missing width or height, default "{}"'.format(DEFAULT_RATIO),
         required=False,
     )
     nesting = forms.CheckboxField(
@@ -28,8 +42,20 @@ class Form(forms.BaseForm):
         required=False,
         initial=False,
     )
+    responsive_images_mode = forms.CharField(
+        'Responsive images mode, "width" (srcset by width) or "density" (1x/2x/3x), '
+        'default "{}"'.format(DEFAULT_RESPONSIVE_IMAGES_MODE),
+        required=False,
+    )
     responsive_images_viewport_breakpoints = forms.CharField(
-        'List of viewport breakpoints (in pixels) for responsive images (comma separated)',
+        'List of viewport breakpoints (in pixels) for responsive images, default "{}" '
+        '(comma separated)'.format(join(DEFAULT_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS)),
+        required=False,
+    )
+    responsive_images_densities = forms.CharField(
+        'List of pixel densities for the density mode, default "{}" (comma separated)'.format(
+            join(DEFAULT_RESPONSIVE_IMAGES_DENSITIES)
+        ),
         required=False,
     )
 
@@ -44,8 +70,14 @@ class Form(forms.BaseForm):
             data['alignment'] = ', '.join(data['alignment'])
 
         # prettify
-        for field in ('templates', 'alignment', 'responsive_images_viewport_breakpoints'):
-            data[field] = ', '.join(split_and_strip(data[field]))
+        for field in (
+            'templates',
+            'alignment',
+            'responsive_images_viewport_breakpoints',
+            'responsive_images_densities',
+        ):
+            data[field] = ', '.join(split_and_strip(data.get(field) or ''))
+        data['responsive_images_mode'] = (data.get('responsive_images_mode') or '').strip().lower()
 
         return data
 
@@ -70,4 +102,10 @@ class Form(forms.BaseForm):
         if breakpoints:
             breakpoints = [float(x) for x in split_and_strip(breakpoints)]
             settings['DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS'] = breakpoints
+        if data.get('responsive_images_mode') in ('width', 'density'):
+            settings['DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_MODE'] = data['responsive_images_mode']
+        densities = data.get('responsive_images_densities')
+        if densities:
+            densities = [float(x) for x in split_and_strip(densities)]
+            settings['DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_DENSITIES'] = densities
         return settings
@@ -0,0 +1,33 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+
+
+class PictureConfig(AppConfig):
+    name = 'djangocms_picture'
+    verbose_name = _('Picture')
+
+    def ready(self):
+        from .models import Picture
+        from .signals import (
+            delete_picture_external_copy,
+            regenerate_picture_thumbnails,
+            update_picture_source_fields,
+        )
+
+        image_model = Picture._meta.get_field('picture').related_model
+        post_save.connect(
+            update_picture_source_fields,
+            sender=image_model,
+            dispatch_uid='djangocms_picture_update_source_fields',
+        )
+        post_save.connect(
+            regenerate_picture_thumbnails,
+            sender=image_model,
+            dispatch_uid='djangocms_picture_regenerate_thumbnails',
+        )
+        post_delete.connect(
+            delete_picture_external_copy,
+            sender=Picture,
+            dispatch_uid='djangocms_picture_delete_external_copy',
+        )
@@ -0,0 +1,115 @@
+"""
+Remembers the name and dimensions of existing thumbnails, so rendering a
+picture does not have to ask the storage (or the easy_thumbnails tables)
+whether its thumbnails exist. Lookups go to a small in-process LRU first
+and to the configured Django cache second.
+
+Keys contain the SHA1 of the source image, replacing the image file
+therefore never returns the thumbnails of the previous one.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from easy_thumbnails.utils import get_storage_hash
+
+from .conf import get_settings
+
+
+class LRUCache:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                return None
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+_local_cache = None
+
+
+def get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = LRUCache(get_settings().thumbnail_local_cache_size)
+    return _local_cache
+
+
+@receiver(setting_changed)
+def reset_local_cache(setting, **kwargs):
+    # sized by the settings, and filled from the cache they select
+    global _local_cache
+    if setting.startswith('DJANGOCMS_PICTURE_'):
+        _local_cache = None
+
+
+def get_cache():
+    alias = get_settings().thumbnail_cache
+    return caches[alias] if alias else None
+
+
+def get_cache_key(thumbnailer, sha1, thumbnail_options):
+    if not sha1:
+        return None
+    thumbnail_options = thumbnailer.get_options(thumbnail_options)
+    data = repr((
+        get_storage_hash(thumbnailer.thumbnail_storage),
+        type(thumbnailer).__name__,
+        thumbnailer.name,
+        sha1,
+        thumbnailer.thumbnail_extension,
+        thumbnailer.thumbnail_preserve_extensions,
+        sorted(thumbnail_options.items()),
+    ))
+    return 'djangocms_picture:thumbnail:{}'.format(hashlib.sha1(data.encode()).hexdigest())
+
+
+def get_many(keys):
+    """
+    Returns a dictionary mapping the found keys to ``(name, width, height)``.
+    """
+    cache = get_cache()
+    if cache is None:
+        return {}
+    local_cache = get_local_cache()
+    found = {}
+    for key in keys:
+        value = local_cache.get(key)
+        if value is not None:
+            found[key] = value
+    remaining = [key for key in keys if key not in found]
+    if remaining:
+        for key, value in cache.get_many(remaining).items():
+            local_cache.set(key, value)
+            found[key] = value
+    return found
+
+
+def set_many(mapping):
+    cache = get_cache()
+    if cache is None or not mapping:
+        return
+    local_cache = get_local_cache()
+    for key, value in mapping.items():
+        local_cache.set(key, value)
+    cache.set_many(mapping, timeout=get_settings().thumbnail_cache_timeout)
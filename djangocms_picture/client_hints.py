@@ -0,0 +1,54 @@
+"""
+Reads the client hints of a request, used to render a single best-fit
+thumbnail instead of a ``srcset`` when
+``DJANGOCMS_PICTURE_CLIENT_HINTS`` is enabled.
+"""
+from .conf import get_settings
+
+# hints requested through ``Accept-CH`` and varied on
+CLIENT_HINTS = ('Sec-CH-DPR', 'Sec-CH-Width', 'Sec-CH-Viewport-Width', 'Save-Data')
+
+
+def is_enabled():
+    return get_settings().client_hints
+
+
+def get_header(request, *names):
+    for name in names:
+        value = request.headers.get(name)
+        if value:
+            return value.strip().strip('"')
+    return None
+
+
+def get_number(request, *names):
+    try:
+        return float(get_header(request, *names))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_client_hints(request):
+    """
+    Returns the ``dpr``, ``width`` and ``viewport_width`` hints of the
+    request (``None`` if missing) and whether it asks to ``save_data``.
+    Returns ``None`` if the client sent no size related hint.
+    """
+    hints = {
+        'dpr': get_number(request, 'Sec-CH-DPR', 'DPR'),
+        'width': get_number(request, 'Sec-CH-Width', 'Width'),
+        'viewport_width': get_number(request, 'Sec-CH-Viewport-Width', 'Viewport-Width'),
+    }
+    if not any(hints.values()):
+        return None
+    hints['save_data'] = (get_header(request, 'Save-Data') or '').lower() == 'on'
+    return hints
+
+
+def mark_varied(request):
+    # the response depends on the hints and has to vary on them
+    request._picture_client_hints = True
+
+
+def is_varied(request):
+    return getattr(request, '_picture_client_hints', False)
@@ -1,13 +1,66 @@
+from functools import lru_cache
+
 from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
-from django.conf import settings
+from cms.utils.placeholder import get_placeholders
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
+from . import client_hints, deferred, render_cache
+from .conf import get_settings
 from .forms import PictureForm
 from .models import Picture
+from .preload import add_preload, get_preload_block
+from .thumbnails import get_mime_type
+
+# enable nesting of plugins inside the picture plugin, read once as the
+# plugin class is registered with it
+PICTURE_NESTING = get_settings().nesting
+
+
+def get_sizes(columns):
+    """
+    Returns the ``sizes`` attribute for ``columns``, a list of
+    ``(breakpoint, width)`` tuples describing the width of the placeholder
+    up to each viewport breakpoint, e.g. ``[(576, '100vw'), (None, 360)]``.
+    Breakpoints can be given in pixels or as media conditions, widths in
+    pixels or as CSS lengths, ``None`` marks the width beyond the last
+    breakpoint.
+    """
+    sizes = []
+    for breakpoint, width in columns:
+        if isinstance(width, (int, float)):
+            width = '{}px'.format(int(width))
+        if breakpoint is None:
+            sizes.append(width)
+        elif isinstance(breakpoint, (int, float)):
+            sizes.append('(max-width: {}px) {}'.format(int(breakpoint), width))
+        else:
+            sizes.append('{} {}'.format(breakpoint, width))
+    return ', '.join(sizes)
+
+
+@lru_cache()
+def get_first_placeholder_slot(template):
+    placeholders = get_placeholders(template)
+    return placeholders[0].slot if placeholders else None
+
 
-# enable nesting of plugins inside the picture plugin
-PICTURE_NESTING = getattr(settings, 'DJANGOCMS_PICTURE_NESTING', False)
+def is_first_placeholder(request, instance):
+    """
+    Returns whether the placeholder of ``instance`` is the first placeholder
+    declared by the template of the current page, or without page the first
+    one rendered.
+    """
+    page = getattr(request, 'current_page', None)
+    if page:
+        if not hasattr(request, '_picture_first_slot'):
+            request._picture_first_slot = get_first_placeholder_slot(page.get_template())
+        return instance.placeholder.slot == request._picture_first_slot
+    if not hasattr(request, '_picture_first_placeholder'):
+        request._picture_first_placeholder = instance.placeholder_id
+    return instance.placeholder_id == request._picture_first_placeholder
 
 
 class PicturePlugin(CMSPluginBase):
@@ -28,10 +81,11 @@ class PicturePlugin(CMSPluginBase):
             'classes': ('collapse',),
             'fields': (
                 'template',
-                'use_responsive_image',
+                ('use_responsive_image', 'responsive_image_mode'),
                 ('width', 'height'),
                 'alignment',
                 'caption_text',
+                ('loading', 'fetch_priority'),
                 'attributes',
             )
         }),
@@ -53,10 +107,197 @@ class PicturePlugin(CMSPluginBase):
         })
     ]
 
+    @classmethod
+    def get_render_queryset(cls):
+        # load the image, thumbnail options and linked page (including the
+        # titles its URL is built from) for all pictures of a placeholder
+        # at once instead of one by one while rendering
+        queryset = super().get_render_queryset()
+        return queryset.select_related(
+            'picture',
+            'thumbnail_options',
+            'link_page',
+        ).prefetch_related('link_page__title_set')
+
+    def is_eager(self, context, instance, placeholder):
+        # the first pictures of the first placeholder are the likely
+        # candidates for the largest contentful paint
+        request = context.get('request')
+        if request is None or not instance.placeholder_id:
+            return False
+        if not is_first_placeholder(request, instance):
+            return False
+        positions = request.__dict__.setdefault('_picture_positions', {})
+        positions[instance.placeholder_id] = positions.get(instance.placeholder_id, 0) + 1
+        return positions[instance.placeholder_id] <= get_settings().eager_pictures
+
+    def get_loading_attributes(self, context, instance, placeholder):
+        """
+        Returns the ``loading``, ``decoding`` and ``fetchpriority`` attributes
+        of the image, resolving the automatic settings.
+        """
+        loading = instance.loading
+        fetch_priority = instance.fetch_priority
+        if 'auto' in (loading, fetch_priority):
+            eager = self.is_eager(context, instance, placeholder)
+            if loading == 'auto':
+                loading = 'eager' if eager else 'lazy'
+            if fetch_priority == 'auto':
+                fetch_priority = 'high' if eager else None
+        return {
+            'loading': loading,
+            'decoding': 'async' if loading == 'lazy' else None,
+            'fetchpriority': fetch_priority,
+        }
+
+    def get_style(self, context, instance):
+        # reserve the space of the image before it is loaded
+        style = []
+        if context['picture_dimensions']['aspect_ratio']:
+            style.append('aspect-ratio: {};'.format(context['picture_dimensions']['aspect_ratio']))
+        if context['picture_placeholder_style']:
+            style.append(context['picture_placeholder_style'])
+        return ' '.join(style)
+
+    def add_preload(self, context, instance):
+        """
+        Preloads the image in the ``<head>`` of the page, preferring the
+        first additional format (as ``<picture>`` does) with its srcset.
+        """
+        src = context['picture_src']
+        if not src:
+            return
+        srcset = context['img_srcset_data']
+        density_srcset = context['picture_density_srcset']
+        mime_type = None
+        if context['picture_sources']:
+            source = context['picture_sources'][0]
+            src, mime_type = source['src'].url, source['type']
+            srcset, density_srcset = source['srcset'], source['density_srcset']
+        imagesrcset = imagesizes = None
+        if density_srcset:
+            imagesrcset = ', '.join(
+                ['{} 1x'.format(src)]
+                + ['{} {}x'.format(thumb.url, density) for density, thumb in density_srcset]
+            )
+        elif srcset:
+            imagesrcset = ', '.join(
+                ['{} {}w'.format(thumb.url, thumb.width) for size, thumb in srcset]
+                + ['{} {}w'.format(src, context['picture_width'])]
+            )
+            imagesizes = context['picture_sizes'] or ', '.join(
+                ['(max-width: {0}px) {0}px'.format(size) for size, thumb in srcset]
+                + ['{}px'.format(context['picture_size']['size'][0])]
+            )
+        add_preload(context, src, imagesrcset, imagesizes, mime_type)
+
+    def get_vary_cache_on(self, request, instance, placeholder):
+        # cached placeholders have to be kept per client hints
+        if client_hints.is_enabled():
+            return list(client_hints.CLIENT_HINTS)
+        return super().get_vary_cache_on(request, instance, placeholder)
+
+    def render_client_hints(self, context, instance):
+        """
+        Renders the single thumbnail best fitting the client hints of the
+        request, returns ``False`` if the hints are disabled or missing.
+        """
+        request = context.get('request')
+        if request is None or not client_hints.is_enabled():
+            return False
+        client_hints.mark_varied(request)
+        hints = client_hints.get_client_hints(request)
+        if hints is None:
+            return False
+
+        # save data clients get the image in CSS pixels
+        dpr = 1 if hints['save_data'] else hints['dpr'] or 1
+        width = hints['width']
+        if not width:
+            width = context['picture_dimensions']['width'] or context['picture_size']['size'][0]
+            if hints['viewport_width']:
+                width = min(width, hints['viewport_width'])
+            width *= dpr
+        thumbnail_options = instance.get_best_fit_thumbnail_options(width, hints['save_data'])
+        thumbnail = instance.get_thumbnail(thumbnail_options) if thumbnail_options else None
+        if thumbnail is None:
+            return False
+
+        context['picture_src'] = thumbnail.url
+        context['img_srcset_data'] = None
+        context['picture_density_srcset'] = None
+        context['picture_sources'] = []
+        for extension in instance.get_picture_formats():
+            source = instance.get_thumbnail(thumbnail_options, extension)
+            # left out while another worker generates it
+            if source:
+                context['picture_sources'].append({
+                    'type': get_mime_type(extension),
+                    'src': source,
+                    'srcset': [],
+                    'density_srcset': [],
+                })
+        return True
+
     def get_render_template(self, context, instance, placeholder):
+        if 'picture_html' in context:
+            # rendered already, taken from the render cache
+            return 'djangocms_picture/fragment.html'
         return 'djangocms_picture/{}/picture.html'.format(instance.template)
 
+    def is_render_cacheable(self, context, instance):
+        # the HTML of client hints and nested plugins depends on more than
+        # the picture
+        return (
+            render_cache.get_cache() is not None
+            and not client_hints.is_enabled()
+            and not getattr(instance, 'child_plugin_instances', None)
+        )
+
+    def is_plan_cacheable(self, instance):
+        # thumbnails still being generated are rendered again, as are the
+        # thumbnail view URLs standing in for missing thumbnails unless the
+        # view serves all of them
+        thumbnails = instance.get_render_plan().thumbnails.values()
+        return None not in thumbnails and (
+            deferred.is_serving_enabled()
+            or not any(isinstance(thumbnail, deferred.DeferredThumbnail) for thumbnail in thumbnails)
+        )
+
     def render(self, context, instance, placeholder):
+        # the loading attributes depend on the position of the picture
+        loading = self.get_loading_attributes(context, instance, placeholder)
+        instance._picture_preloaded = loading['fetchpriority'] == 'high'
+        if not self.is_render_cacheable(context, instance):
+            return self.render_picture(context, instance, placeholder, loading)
+
+        cache = render_cache.get_cache()
+        preload_block = get_preload_block(context)
+        cache_key = render_cache.get_cache_key(
+            instance,
+            context.get('width'),
+            context.get('height'),
+            context.get('picture_columns'),
+            loading,
+        )
+        cached = cache.get(cache_key)
+        if cached is None:
+            preload_count = len(preload_block) if preload_block is not None else 0
+            context = self.render_picture(context, instance, placeholder, loading)
+            html = get_template(
+                self.get_render_template(context, instance, placeholder)
+            ).render(context.flatten())
+            cached = (html, list(preload_block)[preload_count:] if preload_block is not None else [])
+            if self.is_plan_cacheable(instance):
+                cache.set(cache_key, cached, render_cache.get_timeout())
+        elif preload_block is not None:
+            for tag in cached[1]:
+                preload_block.append(tag)
+        context['instance'] = instance
+        context['picture_html'] = mark_safe(cached[0])
+        return context
+
+    def render_picture(self, context, instance, placeholder, loading):
         if instance.alignment:
             classes = 'align-{} '.format(instance.alignment)
             classes += instance.attributes.get('class', '')
@@ -69,7 +310,31 @@ class PicturePlugin(CMSPluginBase):
             width=context.get('width') or 0,
             height=context.get('height') or 0,
         )
-        context['img_srcset_data'] = instance.img_srcset_data
+        # the column widths of the placeholder (see CMS_PLACEHOLDER_CONF)
+        columns = context.get('picture_columns')
+        context['picture_sizes'] = get_sizes(columns) if columns else None
+        context['picture_placeholder_style'] = instance.placeholder_style
+        context['picture_dimensions'] = instance.img_dimensions
+        if not self.render_client_hints(context, instance):
+            context['picture_src'] = instance.img_src
+            context['img_srcset_data'] = instance.img_srcset_data
+            context['picture_density_srcset'] = instance.img_density_srcset
+            context['picture_sources'] = instance.img_sources
+        # the width of the main image as ``w`` descriptor of the srcset
+        context['picture_width'] = (
+            context['picture_dimensions']['intrinsic_width'] or context['picture_size']['size'][0]
+        )
+        context['picture_style'] = self.get_style(context, instance)
+        if context['picture_style'] and instance.attributes.get('style'):
+            # keep reserving the space along with the style of the editor,
+            # which comes last to take precedence, rendered by attributes_str
+            instance.attributes = dict(
+                instance.attributes,
+                style='{} {}'.format(context['picture_style'], instance.attributes['style']),
+            )
+        context['picture_loading'] = loading
+        if instance._picture_preloaded:
+            self.add_preload(context, instance)
 
         return super().render(context, instance, placeholder)
 
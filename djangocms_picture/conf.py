@@ -0,0 +1,123 @@
+"""
+The settings of the picture plugin, read into an immutable ``PictureSettings``
+once instead of on every access while rendering. The snapshot is read again
+when a ``DJANGOCMS_PICTURE_*`` setting changes (e.g. ``override_settings``).
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+PictureSettings = namedtuple('PictureSettings', [
+    'templates',
+    'alignment',
+    'ratio',
+    'nesting',
+    'responsive_images',
+    'responsive_images_mode',
+    'responsive_images_densities',
+    'responsive_images_viewport_breakpoints',
+    'save_data_encoding_profile',
+    'hashed_thumbnail_names',
+    'placeholder_size',
+    'eager_pictures',
+    'formats',
+    'encoding_profiles',
+    'template_encoding_profiles',
+    'thumbnail_option_encoding_profiles',
+    'client_hints',
+    'deferred_thumbnails',
+    'serve_thumbnails',
+    'render_cache',
+    'render_cache_timeout',
+    'thumbnail_cache',
+    'thumbnail_cache_timeout',
+    'thumbnail_local_cache_size',
+    'thumbnail_lock_wait',
+    'serve_thumbnails_offload',
+    'serve_thumbnails_offload_prefix',
+])
+
+DEFAULT_ALIGNMENT = (
+    ('left', _('Align left')),
+    ('right', _('Align right')),
+    ('center', _('Align center')),
+)
+
+# use golden ration as default (https://en.wikipedia.org/wiki/Golden_ratio)
+DEFAULT_RATIO = 1.6180
+
+DEFAULT_RESPONSIVE_IMAGES_MODE = 'width'
+
+DEFAULT_RESPONSIVE_IMAGES_DENSITIES = (2, 3)
+
+DEFAULT_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS = (576, 768, 992)
+
+_settings = None
+
+
+def load_settings():
+    return PictureSettings(
+        # additional templates are added through ``settings.py``
+        templates=(('default', _('Default')),) + tuple(
+            getattr(settings, 'DJANGOCMS_PICTURE_TEMPLATES', [])
+        ),
+        # renders a class or inline styles depending on your template setup
+        alignment=tuple(getattr(settings, 'DJANGOCMS_PICTURE_ALIGN', DEFAULT_ALIGNMENT)),
+        ratio=getattr(settings, 'DJANGOCMS_PICTURE_RATIO', DEFAULT_RATIO),
+        nesting=getattr(settings, 'DJANGOCMS_PICTURE_NESTING', False),
+        responsive_images=getattr(settings, 'DJANGOCMS_PICTURE_RESPONSIVE_IMAGES', False),
+        responsive_images_mode=getattr(
+            settings, 'DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_MODE', DEFAULT_RESPONSIVE_IMAGES_MODE,
+        ),
+        # ascending, the size ladders are built from the smallest
+        responsive_images_densities=tuple(sorted(getattr(
+            settings, 'DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_DENSITIES', DEFAULT_RESPONSIVE_IMAGES_DENSITIES,
+        ))),
+        responsive_images_viewport_breakpoints=tuple(sorted(getattr(
+            settings,
+            'DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS',
+            DEFAULT_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS,
+        ))),
+        save_data_encoding_profile=getattr(settings, 'DJANGOCMS_PICTURE_SAVE_DATA_ENCODING_PROFILE', None),
+        hashed_thumbnail_names=getattr(settings, 'DJANGOCMS_PICTURE_HASHED_THUMBNAIL_NAMES', False),
+        placeholder_size=getattr(settings, 'DJANGOCMS_PICTURE_PLACEHOLDER_SIZE', 20),
+        eager_pictures=getattr(settings, 'DJANGOCMS_PICTURE_EAGER_PICTURES', 1),
+        formats=tuple(getattr(settings, 'DJANGOCMS_PICTURE_FORMATS', [])),
+        encoding_profiles=getattr(settings, 'DJANGOCMS_PICTURE_ENCODING_PROFILES', {}),
+        template_encoding_profiles=getattr(settings, 'DJANGOCMS_PICTURE_TEMPLATE_ENCODING_PROFILES', {}),
+        thumbnail_option_encoding_profiles=getattr(
+            settings, 'DJANGOCMS_PICTURE_THUMBNAIL_OPTION_ENCODING_PROFILES', {},
+        ),
+        client_hints=getattr(settings, 'DJANGOCMS_PICTURE_CLIENT_HINTS', False),
+        deferred_thumbnails=getattr(settings, 'DJANGOCMS_PICTURE_DEFERRED_THUMBNAILS', False),
+        serve_thumbnails=getattr(settings, 'DJANGOCMS_PICTURE_SERVE_THUMBNAILS', False),
+        # the alias of a cache in ``CACHES``, ``None`` disables it
+        render_cache=getattr(settings, 'DJANGOCMS_PICTURE_RENDER_CACHE', None),
+        render_cache_timeout=getattr(settings, 'DJANGOCMS_PICTURE_RENDER_CACHE_TIMEOUT', 60 * 60 * 24),
+        # the alias of the Django cache to use, ``None`` disables caching
+        thumbnail_cache=getattr(settings, 'DJANGOCMS_PICTURE_THUMBNAIL_CACHE', 'default'),
+        thumbnail_cache_timeout=getattr(settings, 'DJANGOCMS_PICTURE_THUMBNAIL_CACHE_TIMEOUT', 60 * 60 * 24 * 30),
+        thumbnail_local_cache_size=getattr(settings, 'DJANGOCMS_PICTURE_THUMBNAIL_LOCAL_CACHE_SIZE', 1000),
+        thumbnail_lock_wait=getattr(settings, 'DJANGOCMS_PICTURE_THUMBNAIL_LOCK_WAIT', 5),
+        serve_thumbnails_offload=getattr(settings, 'DJANGOCMS_PICTURE_SERVE_THUMBNAILS_OFFLOAD', None),
+        serve_thumbnails_offload_prefix=getattr(
+            settings, 'DJANGOCMS_PICTURE_SERVE_THUMBNAILS_OFFLOAD_PREFIX', '/internal-media/',
+        ),
+    )
+
+
+def get_settings():
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+@receiver(setting_changed)
+def reset_settings(setting, **kwargs):
+    global _settings
+    if setting.startswith('DJANGOCMS_PICTURE_'):
+        _settings = None
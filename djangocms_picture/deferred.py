@@ -0,0 +1,59 @@
+"""
+Renders URLs of the thumbnail view instead of missing thumbnails when
+``DJANGOCMS_PICTURE_DEFERRED_THUMBNAILS`` is enabled, so rendering a page
+never waits for image processing, or instead of all thumbnails when
+``DJANGOCMS_PICTURE_SERVE_THUMBNAILS`` is enabled. The view generates the
+thumbnail when the browser first requests it. URLs are signed, only
+thumbnails the plugin rendered can be requested.
+"""
+from django.core.signing import Signer
+from django.urls import reverse
+
+from .conf import get_settings
+
+SALT = 'djangocms_picture.thumbnail'
+
+
+class DeferredThumbnail:
+    """
+    Stands in for a thumbnail not generated yet, its dimensions are computed
+    in advance.
+    """
+
+    def __init__(self, url, width, height):
+        self.url = url
+        self.width = width
+        self.height = height
+
+
+def is_enabled():
+    return get_settings().deferred_thumbnails
+
+
+def is_serving_enabled():
+    return get_settings().serve_thumbnails
+
+
+def get_url(instance, extension, thumbnail_options):
+    # unlike ``signing.dumps`` no timestamp, the same thumbnail always gets
+    # the same URL and stays cacheable, the content hash of the source
+    # makes it change along with the image
+    token = Signer(salt=SALT).sign_object({
+        'model': instance._meta.label,
+        'pk': instance.pk,
+        'sha1': instance.get_source_sha1(),
+        'extension': extension,
+        'options': thumbnail_options,
+    }, compress=True)
+    return reverse('djangocms_picture:thumbnail', kwargs={'token': token})
+
+
+def load_token(token):
+    """
+    Returns the model label, primary key, source hash, extension and
+    options of the thumbnail referenced by ``token``, raises
+    ``BadSignature`` if it was not issued by ``get_url``.
+    """
+    data = Signer(salt=SALT).unsign_object(token)
+    thumbnail_options = dict(data['options'], size=tuple(data['options']['size']))
+    return data['model'], data['pk'], data['sha1'], data['extension'], thumbnail_options
@@ -0,0 +1,126 @@
+"""
+Named encoding profiles control how thumbnails are written (quality per
+format, progressive and optimized JPEGs, the WebP method, the AVIF speed
+and whether metadata is kept), so large hero images and small thumbnails
+can trade encoding time against bytes differently.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.dispatch import Signal
+from easy_thumbnails import engine
+from easy_thumbnails.conf import settings as thumbnail_settings
+from PIL import Image
+
+from .conf import get_settings
+
+logger = logging.getLogger(__name__)
+
+# sent for every thumbnail written by djangocms_picture with the arguments
+# ``name``, ``format``, ``profile`` (``None`` without profile), ``size`` and
+# ``bytes``, e.g. to measure the bytes saved by a profile
+thumbnail_encoded = Signal()
+
+# Pillow save options set by profile keys, per format
+PROFILE_SAVE_OPTIONS = {
+    'JPEG': {'quality': 'quality', 'progressive': 'progressive', 'optimize': 'optimize'},
+    'WEBP': {'quality': 'quality', 'webp_method': 'method'},
+    'AVIF': {'quality': 'quality', 'avif_speed': 'speed'},
+    'PNG': {'optimize': 'optimize'},
+}
+
+
+def get_profiles():
+    return get_settings().encoding_profiles
+
+
+def get_profile_name(template=None, thumbnail_option=None):
+    """
+    Returns the name of the profile for a picture template and
+    ``ThumbnailOption``, the latter taking precedence. Falls back to a
+    profile named "default" if there is one.
+    """
+    profiles = get_profiles()
+    candidates = []
+    if thumbnail_option:
+        candidates.append(get_settings().thumbnail_option_encoding_profiles.get(thumbnail_option.name))
+    if template:
+        candidates.append(get_settings().template_encoding_profiles.get(template))
+    candidates.append('default')
+    for name in candidates:
+        if name in profiles:
+            return name
+    return None
+
+
+def get_profile_value(profile, key, format):
+    # every value can be given per format, e.g. ``{'jpeg': 80, 'avif': 50}``
+    value = profile.get(key)
+    if isinstance(value, dict):
+        return value.get(format.lower())
+    return value
+
+
+def get_save_options(profile, format, image, thumbnail_options):
+    options = {}
+    for key, option in PROFILE_SAVE_OPTIONS.get(format, {}).items():
+        value = get_profile_value(profile, key, format)
+        if value is not None:
+            options[option] = value
+    if format in ('JPEG', 'WEBP', 'AVIF'):
+        options.setdefault('quality', thumbnail_options['quality'])
+    if format == 'JPEG':
+        options.setdefault('subsampling', thumbnail_options['subsampling'])
+        options.setdefault('optimize', True)
+        if thumbnail_settings.THUMBNAIL_PROGRESSIVE and max(image.size) >= thumbnail_settings.THUMBNAIL_PROGRESSIVE:
+            options.setdefault('progressive', True)
+    if get_profile_value(profile, 'strip_metadata', format) is False:
+        for key in ('exif', 'icc_profile'):
+            if image.info.get(key):
+                options[key] = image.info[key]
+    else:
+        # Pillow copies the color profile of PNGs unless told otherwise
+        options['icc_profile'] = None
+    for key, value in thumbnail_settings.THUMBNAIL_IMAGE_SAVE_OPTIONS.get(format, {}).items():
+        options.setdefault(key, value)
+    return options
+
+
+def save_image(image, filename, thumbnail_options):
+    """
+    Encodes ``image`` in the format of ``filename`` using the profile named
+    by the ``encoding`` thumbnail option, returns the encoded bytes.
+    """
+    Image.init()
+    format = Image.EXTENSION.get(os.path.splitext(filename)[1].lower(), 'JPEG')
+    name = thumbnail_options.get('encoding')
+    profile = get_profiles().get(name) if name else None
+    if profile is None:
+        name = None
+        data = engine.save_pil_image(
+            image,
+            filename=filename,
+            quality=thumbnail_options['quality'],
+            subsampling=thumbnail_options['subsampling'],
+        ).read()
+    else:
+        if format == 'JPEG' and image.mode.endswith('A'):
+            image = image.convert(image.mode[:-1])
+        destination = BytesIO()
+        image.save(destination, format=format, **get_save_options(profile, format, image, thumbnail_options))
+        data = destination.getvalue()
+
+    logger.debug(
+        'Encoded thumbnail %s (%s, profile %s, %d bytes)', filename, format, name, len(data),
+        extra={'profile': name, 'format': format, 'bytes': len(data)},
+    )
+    thumbnail_encoded.send(
+        sender=None,
+        name=filename,
+        format=format,
+        profile=name,
+        size=image.size,
+        bytes=len(data),
+    )
+    return data
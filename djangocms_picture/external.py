@@ -0,0 +1,226 @@
+"""
+Keeps local copies of external pictures when
+``DJANGOCMS_PICTURE_EXTERNAL_CACHE`` is enabled, so they can be sized,
+cropped and offered in several sizes like filer images, or only probes their
+dimensions when ``DJANGOCMS_PICTURE_EXTERNAL_PROBE`` is enabled. Both happen
+in the background, rendering never waits for the remote server.
+"""
+import hashlib
+import logging
+import struct
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+from easy_thumbnails.files import get_thumbnailer
+from PIL import Image
+
+from .thumbnails import EXIF_ORIENTATION, TRANSPOSED_ORIENTATIONS
+
+logger = logging.getLogger(__name__)
+
+FetchResult = namedtuple('FetchResult', ['status', 'content', 'etag', 'last_modified'])
+
+EXTERNAL_DIRECTORY = 'djangocms_picture/external'
+
+PROBE_CHUNK_SIZE = 4096
+
+
+def is_enabled():
+    return getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_CACHE', False)
+
+
+def is_probing_enabled():
+    return getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_PROBE', False)
+
+
+def get_storage():
+    # a dotted path to a storage class, defaults to the default storage
+    storage = getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_STORAGE', None)
+    return import_string(storage)() if storage else default_storage
+
+
+def get_fetcher():
+    """
+    Returns the callable fetching external pictures, configurable through
+    ``DJANGOCMS_PICTURE_EXTERNAL_FETCHER``. It receives the URL and the
+    ``etag`` and ``last_modified`` values of the local copy (empty without
+    copy) and returns a ``FetchResult``, with status 304 if the copy is up
+    to date.
+    """
+    fetcher = getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_FETCHER', None)
+    return import_string(fetcher) if fetcher else fetch
+
+
+def get_prober():
+    """
+    Returns the callable probing the dimensions of external pictures,
+    configurable through ``DJANGOCMS_PICTURE_EXTERNAL_PROBER``. It receives
+    the URL and returns ``(width, height)``, ``None`` if unknown.
+    """
+    prober = getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_PROBER', None)
+    return import_string(prober) if prober else probe_url
+
+
+def get_timeout():
+    return getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_TIMEOUT', 10)
+
+
+def check_url(url):
+    if not url.lower().startswith(('http://', 'https://')):
+        raise ValueError('External picture {} is not an HTTP URL'.format(url))
+
+
+def fetch(url, etag='', last_modified=''):
+    check_url(url)
+    max_size = getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_MAX_SIZE', 20 * 1024 * 1024)
+    headers = {'User-Agent': 'djangocms-picture'}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=get_timeout()) as response:
+            content = response.read(max_size + 1)
+            if len(content) > max_size:
+                raise ValueError('External picture {} exceeds {} bytes'.format(url, max_size))
+            return FetchResult(
+                response.status,
+                content,
+                response.headers.get('ETag', ''),
+                response.headers.get('Last-Modified', ''),
+            )
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return FetchResult(304, None, etag, last_modified)
+        raise
+
+
+def probe(content):
+    """
+    Returns the ``(width, height)`` and the file extension of an image,
+    reading its header only. Raises an error for other content.
+    """
+    Image.init()
+    with Image.open(BytesIO(content)) as image:
+        size = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+            # thumbnails are made from the turned image
+            size = size[::-1]
+        extension = {'JPEG': '.jpg', 'TIFF': '.tif'}.get(image.format)
+        if extension is None:
+            extensions = [ext for ext, format in Image.EXTENSION.items() if format == image.format]
+            extension = extensions[0] if extensions else '.img'
+        return size, extension
+
+
+def get_image_size(data):
+    """
+    Returns the ``(width, height)`` of an image from the beginning of its
+    file, ``None`` if it does not contain the header (yet).
+    """
+    if data[4:8] == b'ftyp':
+        # AVIF and other HEIF images, Pillow needs a plugin for them: the
+        # "ispe" property holds the dimensions of the image
+        index = data.find(b'ispe')
+        if index < 0 or len(data) < index + 16:
+            return None
+        return struct.unpack('>II', data[index + 8:index + 16])
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        # Pillow decodes the whole file to open WebP images
+        return get_webp_size(data)
+    try:
+        # only reads the header, the image is not decoded
+        with Image.open(BytesIO(data)) as image:
+            return image.size
+    except (OSError, SyntaxError, struct.error):
+        return None
+
+
+def get_webp_size(data):
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b'VP8L':
+        bits = struct.unpack('<I', data[21:25])[0]
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    if chunk == b'VP8X':
+        return (
+            int.from_bytes(data[24:27], 'little') + 1,
+            int.from_bytes(data[27:30], 'little') + 1,
+        )
+    return None
+
+
+def probe_url(url):
+    """
+    Returns the ``(width, height)`` of the external picture at ``url``,
+    reading at most ``DJANGOCMS_PICTURE_EXTERNAL_PROBE_SIZE`` bytes from the
+    beginning of the file instead of downloading it. ``None`` if unknown.
+    """
+    check_url(url)
+    limit = getattr(settings, 'DJANGOCMS_PICTURE_EXTERNAL_PROBE_SIZE', 64 * 1024)
+    request = urllib.request.Request(url, headers={
+        'User-Agent': 'djangocms-picture',
+        # servers ignoring the range send the whole file, reading stops
+        # at the limit anyway
+        'Range': 'bytes=0-{}'.format(limit - 1),
+    })
+    data = b''
+    with urllib.request.urlopen(request, timeout=get_timeout()) as response:
+        while len(data) < limit:
+            chunk = response.read(min(PROBE_CHUNK_SIZE, limit - len(data)))
+            if not chunk:
+                break
+            data += chunk
+            size = get_image_size(data)
+            if size:
+                return size
+    return None
+
+
+def probe_urls(urls, workers=8):
+    """
+    Probes the dimensions of many external pictures concurrently, returns
+    a dictionary of their sizes, ``None`` for failed probes.
+    """
+    prober = get_prober()
+
+    def probe_or_none(url):
+        try:
+            return prober(url)
+        except Exception as e:
+            logger.warning('Could not probe external picture %s: %s', url, e)
+            return None
+
+    urls = list(urls)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='djangocms_picture_probe') as pool:
+        return dict(zip(urls, pool.map(probe_or_none, urls)))
+
+
+def get_dimension_fields(url, size):
+    # the picture fields holding probed dimensions
+    return {
+        'external_url_hash': get_url_hash(url),
+        'source_width': int(size[0]),
+        'source_height': int(size[1]),
+        'source_modified': now(),
+    }
+
+
+def get_url_hash(url):
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def get_external_thumbnailer(name):
+    return get_thumbnailer(get_storage(), name)
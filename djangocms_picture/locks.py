@@ -0,0 +1,81 @@
+"""
+Makes sure only one worker generates the thumbnails of an image at a time,
+so a page published with many visitors waiting does not decode and resize
+the same image in every request. A lock per image is held in-process and in
+the thumbnail cache (see ``DJANGOCMS_PICTURE_THUMBNAIL_CACHE``) for other
+processes.
+"""
+import hashlib
+import threading
+import time
+import uuid
+import weakref
+
+from easy_thumbnails.utils import get_storage_hash
+
+from .cache import get_cache
+from .conf import get_settings
+
+# seconds after which the lock of a crashed worker expires
+LOCK_EXPIRY = 60
+
+# seconds between attempts to acquire the lock of another process
+LOCK_POLL_INTERVAL = 0.05
+
+_local_locks = weakref.WeakValueDictionary()
+_local_locks_lock = threading.Lock()
+
+
+def get_lock_key(thumbnailer, sha1):
+    data = repr((get_storage_hash(thumbnailer.source_storage), thumbnailer.name, sha1))
+    return 'djangocms_picture:lock:{}'.format(hashlib.sha1(data.encode()).hexdigest())
+
+
+def get_local_lock(key):
+    with _local_locks_lock:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+class GenerationLock:
+    """
+    Holds the lock of ``key`` as a context manager. ``acquired`` is
+    ``False`` if another worker still held it after ``wait`` seconds
+    (defaults to ``DJANGOCMS_PICTURE_THUMBNAIL_LOCK_WAIT``), ``waited``
+    tells whether another worker held it at all.
+    """
+
+    def __init__(self, key, wait=None):
+        self.key = key
+        if wait is None:
+            wait = get_settings().thumbnail_lock_wait
+        self.wait = wait
+        self.acquired = self.waited = False
+        self.local_lock = get_local_lock(key)
+        self.cache = None
+        self.token = uuid.uuid4().hex
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.wait
+        if not self.local_lock.acquire(blocking=False):
+            self.waited = True
+            if not self.local_lock.acquire(timeout=self.wait):
+                return self
+        self.cache = get_cache()
+        self.acquired = self.cache is None or self.cache.add(self.key, self.token, timeout=LOCK_EXPIRY)
+        while not self.acquired and time.monotonic() < deadline:
+            self.waited = True
+            time.sleep(LOCK_POLL_INTERVAL)
+            self.acquired = self.cache.add(self.key, self.token, timeout=LOCK_EXPIRY)
+        if not self.acquired:
+            self.local_lock.release()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.acquired:
+            return
+        if self.cache is not None and self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+        self.local_lock.release()
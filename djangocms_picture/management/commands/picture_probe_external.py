@@ -0,0 +1,51 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from djangocms_picture import external
+
+
+class Command(BaseCommand):
+    help = (
+        'Probes the dimensions of external pictures without local copy, '
+        'reading the beginning of the files only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            default='djangocms_picture.Picture',
+            help='Picture model to process, defaults to "djangocms_picture.Picture".',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of concurrent requests.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Probe pictures with known dimensions again.',
+        )
+
+    def handle(self, *args, **options):
+        queryset = (
+            apps.get_model(options['model']).objects
+            .filter(external_picture__gt='', external_file='')
+        )
+        if not options['all']:
+            queryset = queryset.filter(source_width__isnull=True)
+        # pictures sharing a URL are probed once
+        urls = queryset.values_list('external_picture', flat=True).distinct()
+        sizes = external.probe_urls(urls, workers=options['workers'])
+        probed = 0
+        for url, size in sizes.items():
+            if not size:
+                self.stderr.write('Failed to probe {}'.format(url))
+                continue
+            probed += queryset.filter(external_picture=url).update(
+                **external.get_dimension_fields(url, size)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Probed {} URLs, updated {} pictures'.format(len(sizes), probed)
+        ))
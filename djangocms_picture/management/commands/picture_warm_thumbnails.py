@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from djangocms_picture import external
+from djangocms_picture.tasks import create_process_pool
+
+
+def warm_batch(model_label, pks):
+    """
+    Generates the missing thumbnails of a batch of pictures, returns the
+    number of generated thumbnails and the errors that occurred.
+    """
+    model = apps.get_model(model_label)
+    queryset = model.objects.select_related('picture', 'thumbnail_options').filter(pk__in=pks)
+    generated, errors = 0, []
+    try:
+        for instance in queryset:
+            try:
+                instance.update_external_copy()
+                generated += instance.generate_thumbnails()
+                if not instance.dominant_color:
+                    instance.generate_placeholder()
+            except Exception as e:
+                errors.append((instance.pk, str(e)))
+    finally:
+        connections.close_all()
+    return generated, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates the thumbnails of all pictures (main size and responsive '
+        'breakpoints) and placeholders which do not exist yet.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            default='djangocms_picture.Picture',
+            help='Picture model to process, defaults to "djangocms_picture.Picture".',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes, 0 generates in this process.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of rows fetched from the database at once.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Number of pictures handed to a worker at once.',
+        )
+        parser.add_argument(
+            '--start-after',
+            type=int,
+            default=0,
+            help='Resume after the given picture id (see "last id" in the progress output).',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the missing thumbnails.',
+        )
+
+    def handle(self, *args, **options):
+        model_label = options['model']
+        pictures = Q(picture__isnull=False) & (Q(external_picture__isnull=True) | Q(external_picture=''))
+        if external.is_enabled():
+            # external pictures are fetched first
+            pictures |= Q(external_picture__gt='')
+        queryset = (
+            apps.get_model(model_label).objects
+            .filter(pictures, pk__gt=options['start_after'])
+            .select_related('picture', 'thumbnail_options')
+            .order_by('pk')
+        )
+        self.total = queryset.count()
+        self.processed = 0
+        self.thumbnails = 0
+        self.stdout.write('Processing {} pictures'.format(self.total))
+
+        # batches are submitted in id order but may finish in any order,
+        # only ids below the oldest unfinished batch are safe to resume from
+        self.submitted = []
+        self.finished = set()
+        self.last_id = options['start_after']
+
+        if options['dry_run']:
+            self.report_missing(queryset.iterator(chunk_size=options['chunk_size']))
+            self.summary('missing')
+            return
+
+        pks = queryset.values_list('pk', flat=True).iterator(chunk_size=options['chunk_size'])
+        batches = self.get_batches(pks, options['batch_size'])
+        if options['workers'] > 0:
+            self.warm_in_pool(model_label, batches, options['workers'])
+        else:
+            for batch in batches:
+                self.submitted.append(max(batch))
+                self.batch_done(batch, *warm_batch(model_label, batch))
+        self.summary('generated')
+
+    def summary(self, verb):
+        self.stdout.write(self.style.SUCCESS(
+            '{} thumbnails {} for {} pictures'.format(self.thumbnails, verb, self.processed)
+        ))
+
+    def get_batches(self, pks, batch_size):
+        batch = []
+        for pk in pks:
+            batch.append(pk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def warm_in_pool(self, model_label, batches, workers):
+        # keep the number of pending batches bounded, the ids are streamed
+        pending = {}
+        with create_process_pool(workers) as pool:
+            for batch in batches:
+                if len(pending) >= workers * 2:
+                    self.collect(pending, FIRST_COMPLETED)
+                self.submitted.append(max(batch))
+                pending[pool.submit(warm_batch, model_label, batch)] = batch
+            self.collect(pending)
+
+    def collect(self, pending, return_when='ALL_COMPLETED'):
+        done, not_done = wait(pending, return_when=return_when)
+        for future in done:
+            self.batch_done(pending.pop(future), *future.result())
+
+    def batch_done(self, batch, generated, errors):
+        self.processed += len(batch)
+        self.thumbnails += generated
+        for pk, error in errors:
+            self.stderr.write('Failed to generate thumbnails for picture {}: {}'.format(pk, error))
+        self.finished.add(max(batch))
+        while self.submitted and self.submitted[0] in self.finished:
+            self.last_id = self.submitted.pop(0)
+        self.stdout.write('Processed {} / {} pictures (last id {})'.format(
+            self.processed, self.total, self.last_id,
+        ))
+
+    def report_missing(self, rows):
+        for instance in rows:
+            missing = len(instance.get_missing_thumbnails())
+            self.processed += 1
+            self.thumbnails += missing
+            if missing:
+                self.stdout.write('Picture {}: {} missing thumbnails'.format(instance.pk, missing))
@@ -0,0 +1,56 @@
+from django.utils.cache import patch_vary_headers
+
+from . import client_hints
+from .preload import get_link, get_preloads
+
+
+def is_html(response):
+    return response.get('Content-Type', '').startswith('text/html')
+
+
+class PreloadMiddleware:
+    """
+    Adds a ``Link`` preload header for the pictures preloaded in the
+    ``<head>`` of the response, also when it comes from the django CMS
+    caches. Servers and CDNs supporting 103 Early Hints send it ahead of
+    the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or not is_html(response):
+            return response
+        preloads = get_preloads(response.content.decode(response.charset, 'replace'))
+        if not preloads:
+            return response
+        links = [get_link(preload) for preload in preloads]
+        if response.has_header('Link'):
+            links.insert(0, response['Link'])
+        response['Link'] = ', '.join(links)
+        return response
+
+
+class ClientHintsMiddleware:
+    """
+    Asks browsers for the client hints used to pick a single thumbnail
+    (``DJANGOCMS_PICTURE_CLIENT_HINTS``) and varies responses depending on
+    them accordingly.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not client_hints.is_enabled() or not is_html(response):
+            return response
+        accepted = [hint for hint in client_hints.CLIENT_HINTS if hint != 'Save-Data']
+        if response.has_header('Accept-CH'):
+            accepted.insert(0, response['Accept-CH'])
+        response['Accept-CH'] = ', '.join(accepted)
+        if client_hints.is_varied(request):
+            patch_vary_headers(response, client_hints.CLIENT_HINTS)
+        return response
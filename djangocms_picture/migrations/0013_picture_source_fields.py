@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db import migrations, models
+from PIL import Image
+
+# EXIF orientations turning the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def get_orientation(image):
+    # only reads the header, the image is not decoded
+    try:
+        with image.file.storage.open(image.file.name) as file, Image.open(file) as pil_image:
+            return pil_image.getexif().get(0x0112)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+def fill_source_fields(apps, schema_editor):
+    Picture = apps.get_model('djangocms_picture', 'Picture')
+    plugins = Picture.objects.exclude(picture=None).select_related('picture')
+
+    for plugin in plugins.iterator():
+        image = plugin.picture
+        # filer stores the dimensions before applying the EXIF orientation
+        width, height = image._width, image._height
+        if width and height and get_orientation(image) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        Picture.objects.filter(pk=plugin.pk).update(
+            source_width=int(width) if width else None,
+            source_height=int(height) if height else None,
+            source_subject_location=image.subject_location or '',
+            source_sha1=image.sha1 or '',
+            source_modified=image.modified_at,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.FILER_IMAGE_MODEL),
+        ('djangocms_picture', '0012_alter_picture_cmsplugin_ptr'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='picture',
+            name='source_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='source_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='source_subject_location',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='source_sha1',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='source_modified',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_source_fields, migrations.RunPython.noop),
+    ]
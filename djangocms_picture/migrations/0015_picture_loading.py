@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_picture', '0014_picture_lqip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='picture',
+            name='loading',
+            field=models.CharField(choices=[('auto', 'Automatic'), ('lazy', 'Lazy'), ('eager', 'Eager')], default='auto', help_text='Automatic loads the first images of the page eagerly and all others lazily, see settings.DJANGOCMS_PICTURE_EAGER_PICTURES.', max_length=5, verbose_name='Loading'),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='fetch_priority',
+            field=models.CharField(choices=[('auto', 'Automatic'), ('high', 'High'), ('low', 'Low')], default='auto', help_text='Automatic gives a high priority to the images loaded eagerly.', max_length=4, verbose_name='Fetch priority'),
+        ),
+    ]
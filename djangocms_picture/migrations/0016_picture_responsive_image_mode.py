@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_picture', '0015_picture_loading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='picture',
+            name='responsive_image_mode',
+            field=models.CharField(choices=[('inherit', 'Let settings.DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_MODE decide'), ('width', 'Widths (for images adapting to the viewport)'), ('density', 'Pixel densities (for images of a fixed size)')], default='inherit', help_text='Widths offer the image in the sizes of the viewport breakpoints, pixel densities in multiples of its size for high resolution screens.', max_length=7, verbose_name='Responsive image mode'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_picture', '0016_picture_responsive_image_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='picture',
+            name='external_file',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='external_etag',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='picture',
+            name='external_last_modified',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangocms_picture', '0017_picture_external_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='picture',
+            name='external_url_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
@@ -2,11 +2,14 @@
 Enables the user to add an "Image" plugin that displays an image
 using the HTML <img> tag.
 """
+import hashlib
+
 from cms.models import CMSPlugin
 from cms.models.fields import PageField
-from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
 from django.db import models
+from django.utils.timezone import now
 from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
 from djangocms_attributes_field.fields import AttributesField
@@ -14,39 +17,41 @@ from easy_thumbnails.files import get_thumbnailer
 from filer.fields.image import FilerImageField
 from filer.models import ThumbnailOption
 
+from . import cache as thumbnail_cache
+from . import deferred, external
+from .conf import get_settings
+from .encoding import get_profile_name
+from .locks import GenerationLock, get_lock_key
+from .tasks import enqueue_thumbnails
+from .thumbnails import (
+    can_generate_in_one_pass,
+    create_placeholder,
+    generate_thumbnail_set,
+    get_cached_thumbnail,
+    get_format_thumbnailer,
+    get_hashed_thumbnailer,
+    get_mime_type,
+    get_options_key,
+    get_oriented_size,
+    get_thumbnail_formats,
+    get_thumbnail_size,
+)
+
 
 # add setting for picture alignment, renders a class or inline styles
 # depending on your template setup
 def get_alignment():
-    alignment = getattr(
-        settings,
-        'DJANGOCMS_PICTURE_ALIGN',
-        (
-            ('left', _('Align left')),
-            ('right', _('Align right')),
-            ('center', _('Align center')),
-        )
-    )
-    return alignment
+    return get_settings().alignment
 
 
 # Add additional choices through the ``settings.py``.
 def get_templates():
-    choices = [
-        ('default', _('Default')),
-    ]
-    choices += getattr(
-        settings,
-        'DJANGOCMS_PICTURE_TEMPLATES',
-        [],
-    )
-    return choices
+    return list(get_settings().templates)
 
 
-# use golden ration as default (https://en.wikipedia.org/wiki/Golden_ratio)
-PICTURE_RATIO = getattr(settings, 'DJANGOCMS_PICTURE_RATIO', 1.6180)
-
-# required for backwards compability
+# required for backwards compability, read ``get_settings()`` for the
+# current values
+PICTURE_RATIO = get_settings().ratio
 PICTURE_ALIGNMENT = get_alignment()
 
 LINK_TARGET = (
@@ -62,6 +67,88 @@ RESPONSIVE_IMAGE_CHOICES = (
     ('no', _('No')),
 )
 
+RESPONSIVE_IMAGE_MODE_CHOICES = (
+    ('inherit', _('Let settings.DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_MODE decide')),
+    ('width', _('Widths (for images adapting to the viewport)')),
+    ('density', _('Pixel densities (for images of a fixed size)')),
+)
+
+LOADING_CHOICES = (
+    ('auto', _('Automatic')),
+    ('lazy', _('Lazy')),
+    ('eager', _('Eager')),
+)
+
+FETCH_PRIORITY_CHOICES = (
+    ('auto', _('Automatic')),
+    ('high', _('High')),
+    ('low', _('Low')),
+)
+
+# fields the size options and thumbnails of a picture are computed from,
+# changing any of them invalidates the render plan
+RENDER_PLAN_FIELDS = (
+    'template',
+    'picture_id',
+    'external_picture',
+    'external_file',
+    'width',
+    'height',
+    'use_automatic_scaling',
+    'use_no_cropping',
+    'use_crop',
+    'use_upscale',
+    'use_responsive_image',
+    'responsive_image_mode',
+    'thumbnail_options_id',
+    'source_width',
+    'source_height',
+    'source_subject_location',
+    'source_sha1',
+)
+
+
+def get_source_fields(image, size=None):
+    """
+    Returns the values of a filer image denormalized on pictures using it,
+    its oriented ``size`` is read from the file unless given.
+    """
+    if not image:
+        return {
+            'source_width': None,
+            'source_height': None,
+            'source_subject_location': '',
+            'source_sha1': '',
+            'source_modified': None,
+        }
+    width, height = size or get_oriented_size(image)
+    # unknown dimensions are stored as such, not as a size of 0
+    return {
+        'source_width': int(width) if width else None,
+        'source_height': int(height) if height else None,
+        'source_subject_location': image.subject_location or '',
+        'source_sha1': image.sha1 or '',
+        'source_modified': image.modified_at,
+    }
+
+
+class PictureRenderPlan:
+    """
+    Holds everything computed while rendering a picture (size options,
+    the thumbnailers, generated thumbnails, srcset and source entries) so repeated
+    accessors during one render do not hit easy_thumbnails again.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.sizes = {}
+        self.thumbnails = {}
+        self.thumbnailers = {}
+        self.srcset = None
+        self.density_srcset = None
+        self.sources = None
+        self.dimensions = None
+
 
 class AbstractPicture(CMSPlugin):
     """
@@ -124,7 +211,24 @@ class AbstractPicture(CMSPlugin):
     attributes = AttributesField(
         verbose_name=_('Attributes'),
         blank=True,
-        excluded_keys=['src', 'width', 'height'],
+        excluded_keys=['src', 'width', 'height', 'loading', 'decoding', 'fetchpriority'],
+    )
+    loading = models.CharField(
+        verbose_name=_('Loading'),
+        max_length=5,
+        choices=LOADING_CHOICES,
+        default=LOADING_CHOICES[0][0],
+        help_text=_(
+            'Automatic loads the first images of the page eagerly and all '
+            'others lazily, see settings.DJANGOCMS_PICTURE_EAGER_PICTURES.'
+        ),
+    )
+    fetch_priority = models.CharField(
+        verbose_name=_('Fetch priority'),
+        max_length=4,
+        choices=FETCH_PRIORITY_CHOICES,
+        default=FETCH_PRIORITY_CHOICES[0][0],
+        help_text=_('Automatic gives a high priority to the images loaded eagerly.'),
     )
     # link models
     link_url = models.URLField(
@@ -192,6 +296,16 @@ class AbstractPicture(CMSPlugin):
             'This configuration only applies to uploaded images (external pictures will not be affected). '
         )
     )
+    responsive_image_mode = models.CharField(
+        verbose_name=_('Responsive image mode'),
+        max_length=7,
+        choices=RESPONSIVE_IMAGE_MODE_CHOICES,
+        default=RESPONSIVE_IMAGE_MODE_CHOICES[0][0],
+        help_text=_(
+            'Widths offer the image in the sizes of the viewport breakpoints, '
+            'pixel densities in multiples of its size for high resolution screens.'
+        )
+    )
     # overrides all other options
     # throws validation error if other cropping options are selected
     thumbnail_options = models.ForeignKey(
@@ -203,6 +317,70 @@ class AbstractPicture(CMSPlugin):
         on_delete=models.CASCADE,
     )
 
+    # copies of the filer image attributes used to compute sizes and
+    # thumbnails, kept in sync through signals so they are available
+    # without loading the image
+    source_width = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    source_height = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    source_subject_location = models.CharField(
+        blank=True,
+        max_length=64,
+        editable=False,
+    )
+    source_sha1 = models.CharField(
+        blank=True,
+        max_length=40,
+        editable=False,
+    )
+    source_modified = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    # low quality image placeholder shown while the image loads, computed
+    # in the background together with the thumbnails
+    lqip = models.TextField(
+        blank=True,
+        editable=False,
+    )
+    dominant_color = models.CharField(
+        blank=True,
+        max_length=7,
+        editable=False,
+    )
+    # local copy of the external picture with its validators, kept when
+    # ``DJANGOCMS_PICTURE_EXTERNAL_CACHE`` is enabled, its dimensions and
+    # checksum (or the probed dimensions only) are stored in the source
+    # fields, all of them belong to the URL hashed in ``external_url_hash``
+    external_url_hash = models.CharField(
+        blank=True,
+        max_length=40,
+        editable=False,
+    )
+    external_file = models.CharField(
+        blank=True,
+        max_length=255,
+        editable=False,
+    )
+    external_etag = models.CharField(
+        blank=True,
+        max_length=255,
+        editable=False,
+    )
+    external_last_modified = models.CharField(
+        blank=True,
+        max_length=64,
+        editable=False,
+    )
+
     # Add an app namespace to related_name to avoid field name clashes
     # with any other plugins that have a field with the same name as the
     # lowercase of the class name of this model.
@@ -229,12 +407,342 @@ class AbstractPicture(CMSPlugin):
             return self.picture.label
         return gettext('<file is missing>')
 
+    def save(self, *args, **kwargs):
+        previous_copy = ''
+        if self.external_picture:
+            url_hash = external.get_url_hash(self.external_picture)
+            if url_hash != self.external_url_hash:
+                # the copy and dimensions belong to the previous URL
+                previous_copy = self.external_file
+                self.external_file = self.external_etag = self.external_last_modified = ''
+                self.lqip = self.dominant_color = ''
+                for field, value in get_source_fields(None).items():
+                    setattr(self, field, value)
+                self.external_url_hash = url_hash
+        else:
+            # the copy of a removed external picture is not used anymore
+            previous_copy = self.external_file
+            self.external_file = self.external_etag = self.external_last_modified = ''
+            if not self.picture_id or self.uses_loaded_picture():
+                self.external_url_hash = ''
+                source_fields = get_source_fields(self.picture, self.picture and self.get_source_size())
+                if source_fields['source_sha1'] != self.source_sha1:
+                    # the placeholder belongs to the previous image
+                    self.lqip = self.dominant_color = ''
+                for field, value in source_fields.items():
+                    setattr(self, field, value)
+        super().save(*args, **kwargs)
+        self.delete_external_copy(previous_copy)
+        # generate the thumbnails now instead of during the first render
+        enqueue_thumbnails(self)
+
     def copy_relations(self, oldinstance):
         # Because we have a ForeignKey, it's required to copy over
         # the reference from the instance to the new plugin.
         self.picture = oldinstance.picture
 
+    def get_render_plan(self):
+        """
+        Returns the render plan of this instance, rebuilding it whenever one
+        of the ``RENDER_PLAN_FIELDS`` or the responsive settings changed.
+        """
+        key = tuple(getattr(self, field) for field in RENDER_PLAN_FIELDS)
+        key += (self.is_responsive_image, self.is_density_image, get_settings())
+        plan = self.__dict__.get('_render_plan')
+        if plan is None or plan.key != key:
+            plan = self._render_plan = PictureRenderPlan(key)
+        return plan
+
+    def get_thumbnailer(self, extension=None):
+        """
+        Returns the thumbnailer of the picture, writing thumbnails in the
+        format of ``extension`` if given.
+        """
+        plan = self.get_render_plan()
+        if extension not in plan.thumbnailers:
+            if extension:
+                thumbnailer = get_format_thumbnailer(self.get_thumbnailer(), extension)
+            else:
+                if self.uses_external_copy():
+                    thumbnailer = external.get_external_thumbnailer(self.external_file)
+                else:
+                    thumbnailer = get_thumbnailer(self.picture)
+                if self.uses_hashed_thumbnail_names():
+                    thumbnailer = get_hashed_thumbnailer(thumbnailer, self.get_source_sha1())
+            plan.thumbnailers[extension] = thumbnailer
+        return plan.thumbnailers[extension]
+
+    def uses_hashed_thumbnail_names(self):
+        # thumbnails are named after the content of the source, which needs
+        # to be known
+        return (
+            get_settings().hashed_thumbnail_names
+            and bool(self.get_source_sha1())
+        )
+
+    def get_thumbnails(self, options_list, extension=None):
+        """
+        Returns a thumbnail for each entry of ``options_list``. Thumbnails
+        known to exist are taken from the thumbnail cache, the missing ones
+        are generated together decoding the source image only once.
+        """
+        plan = self.get_render_plan()
+        keys = [(extension, get_options_key(options)) for options in options_list]
+        requested = {
+            key: (extension, thumbnail_options)
+            for key, thumbnail_options in zip(keys, options_list)
+            if key not in plan.thumbnails
+        }
+        if requested:
+            self._fetch_thumbnails(requested)
+        return [plan.thumbnails[key] for key in keys]
+
+    def prepare_thumbnails(self):
+        """
+        Fetches all thumbnails required to render this instance in all
+        formats at once, so missing ones are generated together.
+        """
+        plan = self.get_render_plan()
+        requested = {}
+        for extension, thumbnail_options in self.get_required_thumbnails():
+            key = (extension, get_options_key(thumbnail_options))
+            if key not in plan.thumbnails:
+                requested[key] = (extension, thumbnail_options)
+        if requested:
+            self._fetch_thumbnails(requested)
+
+    def _fetch_thumbnails(self, requested):
+        # ``requested`` maps plan keys to ``(extension, thumbnail_options)``
+        plan = self.get_render_plan()
+        if self.serves_thumbnails():
+            # the thumbnail view serves them, no need to look them up
+            for key, (extension, thumbnail_options) in requested.items():
+                plan.thumbnails[key] = self.get_deferred_thumbnail(thumbnail_options, extension)
+            return
+        sha1 = self.get_source_sha1()
+        cache_keys = {
+            key: thumbnail_cache.get_cache_key(self.get_thumbnailer(extension), sha1, thumbnail_options)
+            for key, (extension, thumbnail_options) in requested.items()
+        }
+        cached = thumbnail_cache.get_many([key for key in cache_keys.values() if key])
+        missing = {}
+        for key, (extension, thumbnail_options) in requested.items():
+            thumbnailer = self.get_thumbnailer(extension)
+            if cache_keys[key] in cached:
+                plan.thumbnails[key] = get_cached_thumbnail(
+                    thumbnailer, thumbnail_options, *cached[cache_keys[key]]
+                )
+                continue
+            thumbnail = thumbnailer.get_existing_thumbnail(thumbnail_options)
+            if thumbnail:
+                plan.thumbnails[key] = thumbnail
+            else:
+                missing[key] = (extension, thumbnail_options)
+
+        if missing and self.defers_thumbnails():
+            # generated by the thumbnail view when first requested
+            for key, (extension, thumbnail_options) in missing.items():
+                plan.thumbnails[key] = self.get_deferred_thumbnail(thumbnail_options, extension)
+        elif missing and self.get_thumbnailer().generate:
+            plan.thumbnails.update(self._generate_thumbnails(missing))
+        elif missing:
+            # let easy_thumbnails report the missed thumbnails
+            for key, (extension, thumbnail_options) in missing.items():
+                plan.thumbnails[key] = self.get_thumbnailer(extension).get_thumbnail(thumbnail_options)
+
+        uncached = {}
+        for key, cache_key in cache_keys.items():
+            thumbnail = plan.thumbnails[key]
+            if isinstance(thumbnail, deferred.DeferredThumbnail):
+                continue
+            if thumbnail and cache_key and cache_key not in cached:
+                uncached[cache_key] = (thumbnail.name, thumbnail.width, thumbnail.height)
+        thumbnail_cache.set_many(uncached)
+
+    def _generate_thumbnails(self, missing):
+        """
+        Generates the thumbnails of ``missing``, a dictionary mapping plan
+        keys to ``(extension, thumbnail_options)``, and returns them by key.
+        Only one worker generates the thumbnails of an image at a time, the
+        others wait for it and take the thumbnails it created. ``None`` for
+        thumbnails still being generated when the wait times out.
+        """
+        lock_key = get_lock_key(self.get_thumbnailer(), self.get_source_sha1())
+        with GenerationLock(lock_key) as lock:
+            thumbnails = dict.fromkeys(missing)
+            if lock.waited:
+                # take the thumbnails created by the other worker
+                for key, (extension, thumbnail_options) in missing.items():
+                    thumbnails[key] = self.get_thumbnailer(extension).get_existing_thumbnail(thumbnail_options)
+            if not lock.acquired:
+                return thumbnails
+            generate = [key for key, thumbnail in thumbnails.items() if not thumbnail]
+            thumbnails.update(zip(generate, generate_thumbnail_set([
+                (self.get_thumbnailer(missing[key][0]), missing[key][1])
+                for key in generate
+            ])))
+        return thumbnails
+
+    def get_thumbnail(self, thumbnail_options, extension=None):
+        return self.get_thumbnails([thumbnail_options], extension)[0]
+
+    def defers_thumbnails(self):
+        return deferred.is_enabled() and self.can_defer_thumbnails()
+
+    def serves_thumbnails(self):
+        return deferred.is_serving_enabled() and self.can_defer_thumbnails()
+
+    def can_defer_thumbnails(self):
+        # the dimensions of deferred thumbnails are computed from the size
+        # of the source, without it they are generated right away
+        return not self.__dict__.get('_generate_deferred') and all(self.get_source_size())
+
+    def get_deferred_thumbnail(self, thumbnail_options, extension=None):
+        size = get_thumbnail_size(self.get_source_size(), thumbnail_options)
+        return deferred.DeferredThumbnail(
+            deferred.get_url(self, extension, thumbnail_options), *size
+        )
+
+    def generate_thumbnail(self, thumbnail_options, extension=None):
+        """
+        Returns the thumbnail, generated now if missing even when thumbnails
+        are deferred. ``None`` if another worker is still generating it.
+        """
+        self._generate_deferred = True
+        try:
+            return self.get_thumbnail(thumbnail_options, extension)
+        finally:
+            self._generate_deferred = False
+
+    def uses_external_fields(self):
+        # the copy and dimensions stored for an external picture belong to
+        # its current URL
+        return bool(self.external_picture) and (
+            self.external_url_hash == external.get_url_hash(self.external_picture)
+        )
+
+    def uses_external_copy(self):
+        return bool(self.external_file) and self.uses_external_fields()
+
+    def has_source_image(self):
+        # external pictures can only be resized with a local copy
+        if self.external_picture:
+            return self.uses_external_copy()
+        return bool(self.picture_id)
+
+    def update_external_copy(self):
+        """
+        Fetches the external picture, or revalidates the local copy, and
+        stores it together with its dimensions and checksum. Returns whether
+        the copy changed.
+        """
+        if not self.external_picture or not external.is_enabled():
+            return False
+        url = self.external_picture
+        url_hash = external.get_url_hash(url)
+        copy = self.external_file if url_hash == self.external_url_hash else ''
+        result = external.get_fetcher()(
+            url,
+            etag=self.external_etag if copy else '',
+            last_modified=self.external_last_modified if copy else '',
+        )
+        if result.status == 304:
+            return False
+        (width, height), extension = external.probe(result.content)
+        sha1 = hashlib.sha1(result.content).hexdigest()
+        name = '{}/{}-{}{}'.format(external.EXTERNAL_DIRECTORY, url_hash, sha1[:12], extension)
+        storage = external.get_storage()
+        if name != copy:
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(result.content))
+            self.delete_external_copy(copy)
+        fields = {
+            'external_url_hash': url_hash,
+            'external_file': name,
+            'external_etag': result.etag or '',
+            'external_last_modified': result.last_modified or '',
+            'source_width': width,
+            'source_height': height,
+            'source_subject_location': '',
+            'source_sha1': sha1,
+            'source_modified': now(),
+        }
+        if sha1 != self.source_sha1:
+            # the placeholder belongs to the previous image
+            fields.update(lqip='', dominant_color='')
+        for field, value in fields.items():
+            setattr(self, field, value)
+        # no ``save`` to not enqueue the thumbnails again
+        type(self).objects.filter(pk=self.pk).update(**fields)
+        return True
+
+    def delete_external_copy(self, name):
+        """
+        Deletes the local copy ``name`` of an external picture unless another
+        picture, e.g. the public version of a draft, still uses it.
+        """
+        if name and not type(self).objects.filter(external_file=name).exclude(pk=self.pk).exists():
+            external.get_storage().delete(name)
+
+    def update_external_dimensions(self):
+        """
+        Probes the dimensions of an external picture without local copy,
+        reading the beginning of the file only. Returns whether they were
+        updated.
+        """
+        if (
+            not self.external_picture
+            or external.is_enabled()
+            or not external.is_probing_enabled()
+            or self.source_width
+        ):
+            return False
+        size = external.get_prober()(self.external_picture)
+        if not size:
+            return False
+        fields = external.get_dimension_fields(self.external_picture, size)
+        for field, value in fields.items():
+            setattr(self, field, value)
+        type(self).objects.filter(pk=self.pk).update(**fields)
+        return True
+
+    def uses_loaded_picture(self):
+        # the loaded image is authoritative, it might have been replaced
+        # since the denormalized fields were synced
+        if self.external_picture:
+            return False
+        return (
+            self._meta.get_field('picture').is_cached(self)
+            or self.source_width is None
+        )
+
+    def get_source_size(self):
+        if self.uses_loaded_picture() and (
+            self.source_width is None or self.picture.sha1 != self.source_sha1
+        ):
+            # the stored size belongs to another image or is unknown
+            width, height = get_oriented_size(self.picture)
+            return width or 0, height or 0
+        return self.source_width, self.source_height
+
+    def get_source_sha1(self):
+        if self.uses_loaded_picture():
+            return self.picture.sha1
+        return self.source_sha1
+
+    def get_source_subject_location(self):
+        if self.uses_loaded_picture():
+            return self.picture.subject_location
+        return self.source_subject_location
+
     def get_size(self, width=None, height=None):
+        plan = self.get_render_plan()
+        if (width, height) not in plan.sizes:
+            plan.sizes[(width, height)] = self._calculate_size(width, height)
+        # hand out a copy so callers cannot alter the memoized options
+        return dict(plan.sizes[(width, height)])
+
+    def _calculate_size(self, width=None, height=None):
         crop = self.use_crop
         upscale = self.use_upscale
         # use field thumbnail settings
@@ -247,24 +755,26 @@ class AbstractPicture(CMSPlugin):
             width = self.width
             height = self.height
 
-        if self.picture:
+        if self.has_source_image():
+            source_width, source_height = self.get_source_size()
             # calculate height when not given according to the
             # golden ratio or fallback to the picture size
+            ratio = get_settings().ratio
             if crop:
                 if not height and width:
-                    if self.picture.width > self.picture.height:
-                        height = width / PICTURE_RATIO
+                    if source_width > source_height:
+                        height = width / ratio
                     else:
-                        height = width * PICTURE_RATIO
+                        height = width * ratio
 
                 elif not width and height:
-                    if self.picture.width > self.picture.height:
-                        width = height * PICTURE_RATIO
+                    if source_width > source_height:
+                        width = height * ratio
                     else:
-                        width = height / PICTURE_RATIO
+                        width = height / ratio
 
-            width = width or self.picture.width
-            height = height or self.picture.height
+            width = width or source_width
+            height = height or source_height
 
         # ensure width and height are int
         width = int(width) if width is not None else width
@@ -337,62 +847,402 @@ class AbstractPicture(CMSPlugin):
 
     @property
     def is_responsive_image(self):
-        if self.external_picture:
+        if self.external_picture and not self.uses_external_copy():
             return False
         if self.use_responsive_image == 'inherit':
-            return getattr(settings, 'DJANGOCMS_PICTURE_RESPONSIVE_IMAGES', False)
+            return get_settings().responsive_images
         return self.use_responsive_image == 'yes'
 
     @property
-    def img_srcset_data(self):
-        if not (self.picture and self.is_responsive_image):
-            return None
+    def is_density_image(self):
+        if not self.is_responsive_image:
+            return False
+        if self.responsive_image_mode == 'inherit':
+            return get_settings().responsive_images_mode == 'density'
+        return self.responsive_image_mode == 'density'
 
-        srcset = []
-        thumbnailer = get_thumbnailer(self.picture)
+    def get_density_thumbnail_options(self):
+        """
+        Returns a list of ``(density, thumbnail_options)`` tuples for the
+        high resolution variants of the main image, limited to the
+        resolution of the source unless upscaling.
+        """
+        if not self.has_source_image() or self.use_no_cropping:
+            return []
+        if not all(self.get_source_size()):
+            # the resolution of the image is unknown
+            return []
+        picture_options = self.get_img_src_thumbnail_options()
+        width, height = picture_options['size']
+        if not (width or height):
+            return []
+        limit = float('inf')
+        if not picture_options['upscale']:
+            source_width, source_height = self.get_source_size()
+            if picture_options['crop']:
+                # the cropped size has to fit into the source
+                limit = min(
+                    source_width / width if width else limit,
+                    source_height / height if height else limit,
+                )
+            else:
+                limit = 1 / min(
+                    width / source_width if width else limit,
+                    height / source_height if height else limit,
+                )
+        options_list = []
+        previous = 1
+        for density in get_settings().responsive_images_densities:
+            density = round(min(density, limit), 2)
+            if density <= previous:
+                continue
+            previous = density
+            thumbnail_options = dict(picture_options)
+            thumbnail_options['size'] = (int(width * density), int(height * density))
+            options_list.append((density, thumbnail_options))
+        return options_list
+
+    def get_density_srcset(self, extension=None):
+        # the descriptors are computed from the actual thumbnail widths
+        picture = self.get_thumbnail(self.get_img_src_thumbnail_options(), extension)
+        if not picture:
+            return []
+        return [
+            ('{:g}'.format(round(thumbnail.width / picture.width, 2)), thumbnail)
+            for thumbnail in self.get_thumbnails(
+                [thumbnail_options for density, thumbnail_options in self.get_density_thumbnail_options()],
+                extension,
+            )
+            if thumbnail
+        ]
+
+    def get_srcset_thumbnail_options(self):
+        """
+        Returns a list of ``(breakpoint, thumbnail_options)`` tuples for
+        every responsive candidate narrower than the picture. Candidates
+        keep the aspect ratio of the picture.
+        """
         picture_options = self.get_size(self.width, self.height)
-        picture_width = picture_options['size'][0]
-        thumbnail_options = {'crop': picture_options['crop']}
-        breakpoints = getattr(
-            settings,
-            'DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS',
-            [576, 768, 992],
+        picture_width, picture_height = picture_options['size']
+        if self.has_source_image() and not all(self.get_source_size()):
+            # without the dimensions of the image the candidates are unknown
+            return []
+        if not picture_options['crop'] and self.has_source_image():
+            # the picture is scaled into its size, not cropped to it
+            source_width, source_height = self.get_source_size()
+            scale = min(
+                picture_width / source_width if picture_width else float('inf'),
+                picture_height / source_height if picture_height else float('inf'),
+            )
+            if not picture_options['upscale']:
+                scale = min(scale, 1)
+            picture_width = source_width * scale
+        srcset = []
+        for size in get_settings().responsive_images_viewport_breakpoints:
+            if size >= picture_width:
+                continue
+            if picture_options['crop'] and picture_height:
+                # same aspect ratio as the cropped picture
+                height = max(int(size * picture_height / picture_options['size'][0]), 1)
+            else:
+                # scaled to the width, the height follows
+                height = 0
+            # cropped around the same focal point as the picture
+            srcset.append((int(size), self.add_encoding_option({
+                'crop': picture_options['crop'],
+                'size': (size, height),
+                'upscale': picture_options['upscale'],
+                'subject_location': self.get_source_subject_location(),
+            })))
+        return srcset
+
+    def get_best_fit_thumbnail_options(self, width, save_data=False):
+        """
+        Returns the options of the smallest thumbnail of the size ladder
+        (the breakpoints of ``img_srcset_data`` and the main image) at least
+        ``width`` pixels wide, ``None`` for pictures without thumbnails.
+        """
+        if not self.has_source_image() or self.use_no_cropping:
+            return None
+        thumbnail_options = self.get_img_src_thumbnail_options()
+        for size, srcset_options in self.get_srcset_thumbnail_options():
+            if size >= width:
+                thumbnail_options = srcset_options
+                break
+        profile = get_settings().save_data_encoding_profile
+        if save_data and profile:
+            thumbnail_options = dict(thumbnail_options, encoding=profile)
+        return thumbnail_options
+
+    def get_img_src_thumbnail_options(self):
+        picture_options = self.get_size(
+            width=self.width or 0,
+            height=self.height or 0,
         )
+        return self.add_encoding_option({
+            'size': picture_options['size'],
+            'crop': picture_options['crop'],
+            'upscale': picture_options['upscale'],
+            'subject_location': self.get_source_subject_location(),
+        })
 
-        for size in filter(lambda x: x < picture_width, breakpoints):
-            thumbnail_options['size'] = (size, size)
-            srcset.append((int(size), thumbnailer.get_thumbnail(thumbnail_options)))
+    def get_encoding_profile(self):
+        """
+        Returns the name of the encoding profile used for the thumbnails of
+        this instance, see ``DJANGOCMS_PICTURE_ENCODING_PROFILES``.
+        """
+        return get_profile_name(self.template, self.thumbnail_options)
 
-        return srcset
+    def add_encoding_option(self, thumbnail_options):
+        # the profile name is part of the thumbnail options, and therefore
+        # of the thumbnail file name
+        profile = self.get_encoding_profile()
+        if profile:
+            thumbnail_options['encoding'] = profile
+        return thumbnail_options
+
+    def get_required_thumbnail_options(self):
+        """
+        Returns the options of every thumbnail ``img_src`` and
+        ``img_srcset_data`` need to render this instance.
+        """
+        if not self.has_source_image():
+            return []
+        required = []
+        if not self.use_no_cropping:
+            required.append(self.get_img_src_thumbnail_options())
+        if self.is_density_image:
+            required += [options for density, options in self.get_density_thumbnail_options()]
+        elif self.is_responsive_image:
+            required += [options for size, options in self.get_srcset_thumbnail_options()]
+        return required
+
+    def get_picture_formats(self):
+        """
+        Returns the extensions of the additional formats rendered as
+        ``<source>`` entries, none for pictures without thumbnails.
+        """
+        if not self.has_source_image() or self.use_no_cropping:
+            return []
+        if self.get_thumbnailer().name.lower().endswith('.svg'):
+            return []
+        return get_thumbnail_formats()
+
+    def get_required_thumbnails(self):
+        """
+        Returns an ``(extension, thumbnail_options)`` tuple for every
+        thumbnail needed to render this instance, the extension is ``None``
+        for the format of the source.
+        """
+        required = self.get_required_thumbnail_options()
+        return [
+            (extension, thumbnail_options)
+            for extension in [None] + self.get_picture_formats()
+            for thumbnail_options in required
+        ]
+
+    def get_missing_thumbnails(self):
+        return [
+            (extension, thumbnail_options)
+            for extension, thumbnail_options in self.get_required_thumbnails()
+            if not self.get_thumbnailer(extension).get_existing_thumbnail(thumbnail_options)
+        ]
+
+    def generate_thumbnails(self):
+        """
+        Generates all missing thumbnails required to render this instance
+        and returns how many were generated, leaving out those skipped while
+        another worker held the lock.
+        """
+        missing = {
+            (extension, get_options_key(thumbnail_options)): (extension, thumbnail_options)
+            for extension, thumbnail_options in self.get_missing_thumbnails()
+        }
+        if not missing:
+            return 0
+        thumbnails = {
+            key: thumbnail for key, thumbnail in self._generate_thumbnails(missing).items() if thumbnail
+        }
+        self.get_render_plan().thumbnails.update(thumbnails)
+        return len(thumbnails)
+
+    def generate_placeholder(self):
+        """
+        Computes and stores the low quality image placeholder and dominant
+        color, returns whether they were updated.
+        """
+        size = get_settings().placeholder_size
+        if not size or not self.has_source_image():
+            return False
+        thumbnailer = self.get_thumbnailer()
+        if not can_generate_in_one_pass(thumbnailer):
+            return False
+        self.lqip, self.dominant_color = create_placeholder(thumbnailer, size)
+        # no ``save`` to not enqueue the thumbnails again
+        type(self).objects.filter(pk=self.pk).update(
+            lqip=self.lqip,
+            dominant_color=self.dominant_color,
+        )
+        return True
+
+    @property
+    def placeholder_style(self):
+        """
+        Returns the inline style rendering the placeholder behind the image.
+        Transparent images have no thumbnail placeholder and get none, their
+        background would show through.
+        """
+        if not self.lqip:
+            return ''
+        style = []
+        if self.dominant_color:
+            style.append('background-color: {};'.format(self.dominant_color))
+        if self.lqip:
+            style.append('background-image: url({}); background-size: cover;'.format(self.lqip))
+        return ' '.join(style)
+
+    def get_intrinsic_dimensions(self):
+        """
+        Returns the ``(width, height)`` of the rendered image file, ``None``
+        when unknown. Thumbnail dimensions come from the thumbnail cache.
+        """
+        if self.external_picture and not self.uses_external_copy():
+            if not self.uses_external_fields():
+                return None
+            # probed dimensions of the external picture, if any
+            width, height = self.source_width, self.source_height
+        elif not self.has_source_image():
+            return None
+        elif self.use_no_cropping:
+            width, height = self.get_source_size()
+        else:
+            self.prepare_thumbnails()
+            thumbnail = self.get_thumbnail(self.get_img_src_thumbnail_options())
+            if not thumbnail:
+                return None
+            width, height = thumbnail.width, thumbnail.height
+        if not (width and height):
+            return None
+        return int(width), int(height)
+
+    @property
+    def img_dimensions(self):
+        """
+        Returns the ``width`` and ``height`` attributes of the image, the
+        dimensions set by the editor completed according to the intrinsic
+        aspect ratio, and the dimensions and ``aspect_ratio`` of the image
+        file.
+        """
+        plan = self.get_render_plan()
+        if plan.dimensions is None:
+            intrinsic = self.get_intrinsic_dimensions()
+            width, height = self.width, self.height
+            if intrinsic:
+                if not (width or height):
+                    width, height = intrinsic
+                elif not height:
+                    height = round(width * intrinsic[1] / intrinsic[0])
+                elif not width:
+                    width = round(height * intrinsic[0] / intrinsic[1])
+            plan.dimensions = {
+                'width': width,
+                'height': height,
+                'intrinsic_width': intrinsic[0] if intrinsic else None,
+                'intrinsic_height': intrinsic[1] if intrinsic else None,
+                'aspect_ratio': '{} / {}'.format(*intrinsic) if intrinsic else None,
+            }
+        return plan.dimensions
+
+    @property
+    def img_srcset_data(self):
+        if not (self.has_source_image() and self.is_responsive_image) or self.is_density_image:
+            return None
+
+        plan = self.get_render_plan()
+        if plan.srcset is None:
+            # generate the main thumbnail together with the srcset ones
+            self.prepare_thumbnails()
+            srcset = [
+                (size, self.get_thumbnail(thumbnail_options))
+                for size, thumbnail_options in self.get_srcset_thumbnail_options()
+            ]
+            # leave out thumbnails another worker is still generating
+            plan.srcset = [(size, thumbnail) for size, thumbnail in srcset if thumbnail]
+        return plan.srcset
+
+    @property
+    def img_density_srcset(self):
+        """
+        Returns ``(density, thumbnail)`` tuples of the high resolution
+        variants in density mode, the main image being the ``1x`` variant.
+        """
+        if not (self.has_source_image() and self.is_density_image):
+            return None
+
+        plan = self.get_render_plan()
+        if plan.density_srcset is None:
+            self.prepare_thumbnails()
+            plan.density_srcset = self.get_density_srcset()
+        return plan.density_srcset
+
+    @property
+    def img_sources(self):
+        """
+        Returns a dictionary with the ``type``, the main thumbnail (``src``)
+        and the ``srcset`` or ``density_srcset`` entries for every additional
+        format, in the same sizes as ``img_src``, ``img_srcset_data`` and
+        ``img_density_srcset``.
+        """
+        formats = self.get_picture_formats()
+        if not formats:
+            return []
+
+        plan = self.get_render_plan()
+        if plan.sources is None:
+            self.prepare_thumbnails()
+            srcset_options = []
+            if self.is_responsive_image and not self.is_density_image:
+                srcset_options = self.get_srcset_thumbnail_options()
+            sources = [
+                {
+                    'type': get_mime_type(extension),
+                    'src': self.get_thumbnail(self.get_img_src_thumbnail_options(), extension),
+                    'srcset': [
+                        (size, self.get_thumbnail(thumbnail_options, extension))
+                        for size, thumbnail_options in srcset_options
+                    ],
+                    'density_srcset': self.get_density_srcset(extension) if self.is_density_image else [],
+                }
+                for extension in formats
+            ]
+            plan.sources = [
+                {**source, 'srcset': [(size, thumbnail) for size, thumbnail in source['srcset'] if thumbnail]}
+                for source in sources
+                if source['src']
+            ]
+        return plan.sources
 
     @property
     def img_src(self):
         # we want the external picture to take priority by design
         # please open a ticket if you disagree for an open discussion
-        if self.external_picture:
+        if self.external_picture and (self.use_no_cropping or not self.uses_external_copy()):
             return self.external_picture
         # picture can be empty, for example when the image is removed from filer
         # in this case we want to return an empty string to avoid #69
-        elif not self.picture:
+        elif not self.external_picture and not self.picture:
             return ''
         # return the original, unmodified picture
         elif self.use_no_cropping:
             return self.picture.url
 
-        picture_options = self.get_size(
-            width=self.width or 0,
-            height=self.height or 0,
-        )
-
-        thumbnail_options = {
-            'size': picture_options['size'],
-            'crop': picture_options['crop'],
-            'upscale': picture_options['upscale'],
-            'subject_location': self.picture.subject_location,
-        }
-
-        thumbnailer = get_thumbnailer(self.picture)
-        return thumbnailer.get_thumbnail(thumbnail_options).url
+        # generate the srcset thumbnails together with the main one
+        self.prepare_thumbnails()
+        thumbnail = self.get_thumbnail(self.get_img_src_thumbnail_options())
+        if not thumbnail:
+            # another worker is still generating it
+            return self.external_picture or self.picture.url
+        return thumbnail.url
 
 
 class Picture(AbstractPicture):
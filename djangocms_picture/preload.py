@@ -0,0 +1,72 @@
+"""
+Preloads the pictures likely to be the largest contentful paint with a
+``<link rel="preload">`` tag added to the ``css`` sekizai block, so browsers
+start fetching them together with the stylesheets. The sekizai data is kept
+by the django CMS placeholder cache, the rendered head by the page cache.
+``PreloadMiddleware`` announces the tags in a ``Link`` header as well.
+"""
+import re
+from html import unescape
+
+from django.utils.html import format_html, format_html_join
+from sekizai.helpers import get_varname
+
+PRELOAD_BLOCK = 'css'
+
+PRELOAD_TAG_RE = re.compile(r'<link rel="preload" as="image"((?: [a-z]+="[^"]*")+) fetchpriority="high">')
+
+PRELOAD_ATTRIBUTE_RE = re.compile(r' ([a-z]+)="([^"]*)"')
+
+
+def get_preload_block(context):
+    """
+    Returns the sekizai block the preload tags are added to, ``None`` if
+    the context has no sekizai data.
+    """
+    data = context.get(get_varname())
+    return None if data is None else data[PRELOAD_BLOCK]
+
+
+def get_tag(href, imagesrcset=None, imagesizes=None, type=None):
+    attributes = [
+        (param, value)
+        for param, value in [('href', href), ('imagesrcset', imagesrcset), ('imagesizes', imagesizes), ('type', type)]
+        if value
+    ]
+    return format_html(
+        '<link rel="preload" as="image"{} fetchpriority="high">',
+        format_html_join('', ' {}="{}"', attributes),
+    )
+
+
+def add_preload(context, href, imagesrcset=None, imagesizes=None, type=None):
+    block = get_preload_block(context)
+    if block is not None:
+        block.append(get_tag(href, imagesrcset, imagesizes, type))
+
+
+def get_preloads(content):
+    """
+    Returns the preloads of the tags in the ``<head>`` of ``content``.
+    """
+    head = content.split('</head>', 1)[0]
+    preloads = []
+    for match in PRELOAD_TAG_RE.finditer(head):
+        preload = dict.fromkeys(('href', 'imagesrcset', 'imagesizes', 'type'))
+        preload.update(
+            (param, unescape(value)) for param, value in PRELOAD_ATTRIBUTE_RE.findall(match.group(1))
+        )
+        if preload['href'] and preload not in preloads:
+            preloads.append(preload)
+    return preloads
+
+
+def get_link(preload):
+    """
+    Returns the ``Link`` header entry of a preload.
+    """
+    link = '<{}>; rel=preload; as=image'.format(preload['href'])
+    for param in ('imagesrcset', 'imagesizes', 'type'):
+        if preload[param]:
+            link += '; {}="{}"'.format(param, preload[param])
+    return link + '; fetchpriority=high'
@@ -0,0 +1,67 @@
+"""
+Caches the HTML rendered by the picture plugin when
+``DJANGOCMS_PICTURE_RENDER_CACHE`` names a Django cache. Keys are built from
+everything the HTML depends on (the picture row, its filer image, thumbnail
+option and link, the language, the template and the settings), so any
+change renders the picture again without explicit invalidation.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .conf import get_settings
+
+
+def get_cache():
+    alias = get_settings().render_cache
+    return caches[alias] if alias else None
+
+
+def get_timeout():
+    return get_settings().render_cache_timeout
+
+
+@lru_cache()
+def get_settings_fingerprint():
+    # the settings of the app and of the thumbnails, changing any of them
+    # changes all keys
+    names = sorted(
+        name for name in dir(settings)
+        if name.startswith(('DJANGOCMS_PICTURE_', 'THUMBNAIL_'))
+    )
+    return repr([(name, getattr(settings, name)) for name in names])
+
+
+@receiver(setting_changed)
+def clear_settings_fingerprint(**kwargs):
+    get_settings_fingerprint.cache_clear()
+
+
+def get_version(instance):
+    """
+    Returns the values of the picture the rendered HTML depends on.
+    """
+    version = [
+        (field.attname, getattr(instance, field.attname))
+        for field in instance._meta.concrete_fields
+    ]
+    if instance.picture_id and instance.picture:
+        # e.g. the default alt text
+        version.append(instance.picture.modified_at)
+    if instance.thumbnail_options_id and instance.thumbnail_options:
+        options = instance.thumbnail_options
+        version.append((options.width, options.height, options.crop, options.upscale))
+    # the URL of the linked page
+    version.append(instance.get_link())
+    return version
+
+
+def get_cache_key(instance, *variant):
+    data = repr((get_version(instance), variant, get_settings_fingerprint()))
+    return 'djangocms_picture:render:{}:{}'.format(
+        instance.pk, hashlib.sha1(data.encode()).hexdigest(),
+    )
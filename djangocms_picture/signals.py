@@ -0,0 +1,40 @@
+from .models import Picture, get_source_fields
+from .tasks import enqueue_thumbnails
+
+
+def update_picture_source_fields(sender, instance, created, **kwargs):
+    """
+    Keeps the image attributes denormalized on pictures in sync when the
+    filer image is replaced or edited.
+    """
+    if created:
+        return
+    pictures = Picture.objects.filter(picture=instance)
+    if not pictures.exists():
+        # no need to read the image (and its EXIF data) from the storage
+        return
+    # placeholders of a previous image content are computed again
+    pictures.exclude(source_sha1=instance.sha1 or '').update(lqip='', dominant_color='')
+    pictures.update(**get_source_fields(instance))
+
+
+def regenerate_picture_thumbnails(sender, instance, created, **kwargs):
+    """
+    Pre-generates the thumbnails of all pictures using a filer image
+    when it is replaced or its subject location is changed.
+    """
+    if created:
+        return
+    pictures = Picture.objects.filter(picture=instance).only(
+        'pk', 'picture', 'external_picture',
+    )
+    for picture in pictures:
+        enqueue_thumbnails(picture)
+
+
+def delete_picture_external_copy(sender, instance, **kwargs):
+    """
+    Deletes the local copy of the external picture of a deleted picture
+    unless another picture still uses it.
+    """
+    instance.delete_external_copy(instance.external_file)
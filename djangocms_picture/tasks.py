@@ -0,0 +1,123 @@
+"""
+Runs thumbnail generation outside of the request/response cycle, so the
+first visitor of a page does not pay for decoding and resizing images.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from . import external
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor_backend():
+    # one of "thread", "process", "sync", a dotted path to a callable
+    # receiving ``(func, *args)`` (e.g. to hand over to a task queue)
+    # or ``None`` to disable background generation
+    return getattr(settings, 'DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR', 'thread')
+
+
+def create_process_pool(workers):
+    # spawned workers start from scratch instead of sharing the
+    # database connections of a forked parent
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def get_pool():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'DJANGOCMS_PICTURE_THUMBNAIL_WORKERS', 2)
+            if get_executor_backend() == 'process':
+                _executor = create_process_pool(workers)
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='djangocms_picture',
+                )
+        return _executor
+
+
+def run(func, *args):
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('Background task %s%r failed', func.__name__, args)
+    finally:
+        # workers live outside of the request cycle, nobody else closes
+        # the connections they opened
+        connections.close_all()
+
+
+def submit(func, *args):
+    """
+    Hands ``func(*args)`` over to the configured executor. ``func`` needs
+    to be importable and ``args`` serializable for the "process" executor
+    and custom task queue hooks.
+    """
+    backend = get_executor_backend()
+    if not backend:
+        return
+    if backend == 'sync':
+        func(*args)
+    elif backend in ('thread', 'process'):
+        get_pool().submit(run, func, *args)
+    else:
+        import_string(backend)(func, *args)
+
+
+def generate_thumbnails(model_label, pk):
+    """
+    Generates all thumbnails required to render the given picture instance
+    and its placeholder, after updating the local copy or the dimensions of
+    external pictures.
+    """
+    model = apps.get_model(model_label)
+    instance = (
+        model.objects
+        .select_related('picture', 'thumbnail_options')
+        .filter(pk=pk)
+        .first()
+    )
+    if instance:
+        instance.update_external_copy()
+        instance.update_external_dimensions()
+        instance.generate_thumbnails()
+        if not instance.dominant_color:
+            instance.generate_placeholder()
+
+
+def enqueue_thumbnails(instance):
+    if instance.external_picture:
+        if not (external.is_enabled() or external.is_probing_enabled()):
+            return
+    elif not instance.picture_id:
+        return
+    # plugins are saved more than once when added to the tree,
+    # a single generation per transaction is enough
+    if instance.__dict__.get('_thumbnails_pending'):
+        return
+    instance._thumbnails_pending = True
+
+    def on_commit():
+        instance._thumbnails_pending = False
+        submit(generate_thumbnails, instance._meta.label, instance.pk)
+
+    # wait for the transaction, the worker has to see the saved row
+    transaction.on_commit(on_commit)
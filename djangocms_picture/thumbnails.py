@@ -0,0 +1,351 @@
+"""
+Generates all thumbnails of a picture in one pass: the source is decoded
+only once (reduced while decoding for JPEGs) and every thumbnail is
+produced from a working copy successively downscaled from the largest.
+"""
+import base64
+import copy
+import hashlib
+import os
+from collections import Counter
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from easy_thumbnails import engine, utils
+from easy_thumbnails.conf import settings as thumbnail_settings
+from easy_thumbnails.files import ThumbnailFile
+from filer.thumbnail_processors import normalize_subject_location
+from PIL import Image, ImageFile
+
+from .conf import get_settings
+from .encoding import save_image
+
+PIL_SOURCE_GENERATOR = 'easy_thumbnails.source_generators.pil_image'
+
+# directory of the thumbnail storage holding thumbnails named after their
+# content, see ``DJANGOCMS_PICTURE_HASHED_THUMBNAIL_NAMES``
+HASHED_THUMBNAIL_DIRECTORY = 'djangocms_picture/thumbnails'
+
+# EXIF orientations turning the image by 90 degrees, easy_thumbnails applies
+# them to the source so its width and height are swapped
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# working copies are kept at least this many times larger than the
+# thumbnail made from them, like the ``reducing_gap`` of Pillow
+REDUCING_GAP = 2
+
+
+def get_thumbnail_formats():
+    """
+    Returns the extensions of the additional formats (e.g. ``['avif',
+    'webp']``) thumbnails are generated in, skipping formats the installed
+    Pillow cannot write.
+    """
+    Image.init()
+    return [
+        extension for extension in get_settings().formats
+        if Image.EXTENSION.get('.{}'.format(extension)) in Image.SAVE
+    ]
+
+
+def get_format_thumbnailer(thumbnailer, extension):
+    # a thumbnailer writing every thumbnail in the given format
+    thumbnailer = copy.copy(thumbnailer)
+    thumbnailer.thumbnail_extension = extension
+    thumbnailer.thumbnail_transparency_extension = extension
+    thumbnailer.thumbnail_preserve_extensions = False
+    return thumbnailer
+
+
+class HashedNameThumbnailerMixin:
+    """
+    Names thumbnails after the content hash of the source and the options
+    and format of the thumbnail. A name never refers to another image, an
+    existing thumbnail is up to date and its URL can be cached forever.
+    """
+    source_sha1 = ''
+
+    def get_thumbnail_name(self, thumbnail_options, transparent=False):
+        thumbnail_options = self.get_options(thumbnail_options)
+        source_extension = os.path.splitext(self.name)[1][1:].lower()
+        preserve_extensions = self.thumbnail_preserve_extensions
+        if preserve_extensions is True or source_extension == 'svg' or (
+            isinstance(preserve_extensions, (list, tuple)) and source_extension in preserve_extensions
+        ):
+            extension = source_extension
+        elif transparent:
+            extension = self.thumbnail_transparency_extension
+        else:
+            extension = self.thumbnail_extension
+        extension = extension or 'jpg'
+        data = repr((
+            self.source_sha1,
+            extension,
+            self.thumbnail_quality,
+            sorted(thumbnail_options.items()),
+        ))
+        digest = hashlib.sha1(data.encode()).hexdigest()
+        return os.path.join(
+            self.thumbnail_basedir % {'opts': ''},
+            HASHED_THUMBNAIL_DIRECTORY,
+            digest[:2],
+            '{}.{}'.format(digest, extension),
+        )
+
+    def thumbnail_exists(self, thumbnail_name):
+        # no need to compare modification times
+        return self.thumbnail_storage.exists(thumbnail_name)
+
+
+_hashed_thumbnailer_classes = {}
+
+
+def get_hashed_thumbnailer(thumbnailer, sha1):
+    # a thumbnailer naming thumbnails after the source content ``sha1``
+    cls = type(thumbnailer)
+    if cls not in _hashed_thumbnailer_classes:
+        _hashed_thumbnailer_classes[cls] = type(
+            'Hashed{}'.format(cls.__name__), (HashedNameThumbnailerMixin, cls), {},
+        )
+    thumbnailer = copy.copy(thumbnailer)
+    thumbnailer.__class__ = _hashed_thumbnailer_classes[cls]
+    thumbnailer.source_sha1 = sha1
+    return thumbnailer
+
+
+def get_mime_type(extension):
+    Image.init()
+    return Image.MIME.get(Image.EXTENSION.get('.{}'.format(extension)), 'image/{}'.format(extension))
+
+
+def get_options_key(thumbnail_options):
+    return tuple(sorted(thumbnail_options.items()))
+
+
+def get_oriented_size(image):
+    """
+    Returns the ``(width, height)`` of a filer image as thumbnails are made
+    from it, filer stores them before applying the EXIF orientation.
+    """
+    width, height = image._width, image._height
+    if width and height and get_orientation(image.file) in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return width, height
+
+
+def get_orientation(file):
+    # only reads the header, the image is not decoded
+    try:
+        with file.storage.open(file.name) as data, Image.open(data) as image:
+            return image.getexif().get(EXIF_ORIENTATION)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+def get_thumbnail_size(source_size, thumbnail_options):
+    """
+    Returns the dimensions of the thumbnail ``scale_and_crop`` creates from
+    a source of ``source_size``, without creating it.
+    """
+    source_x, source_y = [float(value) for value in source_size]
+    target_x, target_y = [int(value) for value in thumbnail_options['size']]
+    crop = thumbnail_options.get('crop')
+    if crop or not target_x or not target_y:
+        scale = max(target_x / source_x, target_y / source_y)
+    else:
+        scale = min(target_x / source_x, target_y / source_y)
+    if not target_x:
+        target_x = round(source_x * scale)
+    elif not target_y:
+        target_y = round(source_y * scale)
+    width, height = int(source_x), int(source_y)
+    if scale < 1 or (scale > 1 and thumbnail_options.get('upscale')):
+        width, height = int(round(source_x * scale)), int(round(source_y * scale))
+    if crop and crop != 'scale':
+        width, height = min(width, target_x), min(height, target_y)
+    return width, height
+
+
+def can_generate_in_one_pass(thumbnailer):
+    # the shortcut replaces the default PIL source generator only,
+    # custom generators and vector images go through easy_thumbnails
+    generators = thumbnailer.source_generators or thumbnail_settings.THUMBNAIL_SOURCE_GENERATORS
+    extension = os.path.splitext(thumbnailer.name)[1].lower()
+    return extension != '.svg' and list(generators[:1]) == [PIL_SOURCE_GENERATOR]
+
+
+def open_source_image(thumbnailer, draft_size):
+    """
+    Decodes the source image, returns it together with its scale relative
+    to the original. JPEGs are reduced while decoding as long as they stay
+    larger than ``draft_size``.
+    """
+    was_closed = getattr(thumbnailer, 'closed', False)
+    thumbnailer.open()
+    try:
+        image = Image.open(BytesIO(thumbnailer.read()))
+    finally:
+        if was_closed:
+            thumbnailer.close()
+
+    original_width = image.size[0]
+    if image.format == 'JPEG':
+        image.draft(image.mode, draft_size)
+    try:
+        ImageFile.LOAD_TRUNCATED_IMAGES = True
+        image.load()
+    finally:
+        ImageFile.LOAD_TRUNCATED_IMAGES = False
+    scale = image.size[0] / original_width
+    return utils.exif_orientation(image), scale
+
+
+def reduce_image(image, size, scale):
+    """
+    Reduces ``image`` by the largest integer factor which keeps it
+    ``REDUCING_GAP`` times larger than ``size``.
+    """
+    factors = [
+        image.size[index] // (size[index] * REDUCING_GAP)
+        for index in (0, 1) if size[index]
+    ]
+    factor = min(factors) if factors else 1
+    if factor < 2:
+        return image, scale
+    try:
+        reduced = image.reduce(factor)
+    except ValueError:
+        # not every image mode can be reduced
+        return image, scale
+    return reduced, scale * reduced.size[0] / image.size[0]
+
+
+def get_processor_options(thumbnail_options, scale):
+    # the subject location is given in pixels of the original image
+    subject_location = normalize_subject_location(thumbnail_options.get('subject_location'))
+    if not subject_location or scale == 1:
+        return thumbnail_options
+    processor_options = thumbnail_options.copy()
+    processor_options['subject_location'] = '{},{}'.format(
+        int(subject_location[0] * scale),
+        int(subject_location[1] * scale),
+    )
+    return processor_options
+
+
+def create_thumbnail_file(thumbnailer, image, thumbnail_options):
+    # same as ``Thumbnailer.generate_thumbnail`` after processing
+    filename = thumbnailer.get_thumbnail_name(
+        thumbnail_options,
+        transparent=utils.is_transparent(image),
+    )
+    data = save_image(image, filename, thumbnail_options)
+    thumbnail = ThumbnailFile(
+        filename,
+        file=ContentFile(data),
+        storage=thumbnailer.thumbnail_storage,
+        thumbnail_options=thumbnail_options,
+    )
+    thumbnail.image = image
+    thumbnail._committed = False
+    return thumbnail
+
+
+def get_cached_thumbnail(thumbnailer, thumbnail_options, name, width, height):
+    # a thumbnail known to exist, its dimensions are set so they are
+    # not read from the file
+    thumbnail = ThumbnailFile(
+        name,
+        storage=thumbnailer.thumbnail_storage,
+        thumbnail_options=thumbnail_options,
+    )
+    thumbnail._dimensions_cache = (width, height)
+    return thumbnail
+
+
+def create_placeholder(thumbnailer, size):
+    """
+    Returns a tiny thumbnail no larger than ``size`` pixels as a data URI
+    together with the dominant color of the image as hex string. Images
+    with transparent pixels get no thumbnail, it would show through them.
+    """
+    image, scale = open_source_image(thumbnailer, (size * REDUCING_GAP, size * REDUCING_GAP))
+    image = image.convert('RGBA' if utils.is_transparent(image) else 'RGB')
+    image.thumbnail((size, size), Image.LANCZOS)
+    alpha = image.getchannel('A') if image.mode == 'RGBA' else None
+    transparent = alpha is not None and alpha.getextrema()[0] < 255
+
+    # the most frequent of a few representative colors of the opaque pixels
+    palette = image.convert('RGB').quantize(colors=8)
+    if transparent:
+        counts = Counter(
+            index for index, opacity in zip(palette.getdata(), alpha.getdata())
+            if opacity >= 128
+        )
+        if not counts:
+            return '', ''
+        index = counts.most_common(1)[0][0]
+    else:
+        count, index = max(palette.getcolors())
+    color = '#{:02x}{:02x}{:02x}'.format(*palette.getpalette()[index * 3:index * 3 + 3])
+    if transparent:
+        return '', color
+
+    data = BytesIO()
+    image.convert('RGB').save(data, format='JPEG', quality=70, optimize=True)
+    data_uri = 'data:image/jpeg;base64,{}'.format(base64.b64encode(data.getvalue()).decode())
+    return data_uri, color
+
+
+def generate_thumbnail_set(jobs):
+    """
+    Generates and saves a thumbnail for each ``(thumbnailer, options)`` entry
+    of ``jobs``, returns the thumbnails in the same order. All thumbnailers
+    need to share the same source, they may differ in the output format.
+    """
+    jobs = [
+        (thumbnailer, thumbnailer.get_options(thumbnail_options))
+        for thumbnailer, thumbnail_options in jobs
+    ]
+    if not jobs:
+        return []
+
+    source_thumbnailer = jobs[0][0]
+    if can_generate_in_one_pass(source_thumbnailer):
+        longest = max(max(thumbnail_options['size']) for thumbnailer, thumbnail_options in jobs)
+        # the orientation is only known after decoding, reserve the
+        # longest side in both directions
+        draft_size = (longest * REDUCING_GAP, longest * REDUCING_GAP)
+        working, scale = open_source_image(source_thumbnailer, draft_size)
+        thumbnails = [None] * len(jobs)
+        # an image processed for one format is encoded for all others
+        processed = {}
+        largest_first = sorted(
+            range(len(jobs)),
+            key=lambda index: max(jobs[index][1]['size']),
+            reverse=True,
+        )
+        for index in largest_first:
+            thumbnailer, thumbnail_options = jobs[index]
+            options_key = get_options_key(thumbnail_options)
+            if options_key not in processed:
+                working, scale = reduce_image(working, thumbnail_options['size'], scale)
+                processed[options_key] = engine.process_image(
+                    working,
+                    get_processor_options(thumbnail_options, scale),
+                    thumbnailer.thumbnail_processors,
+                )
+            thumbnails[index] = create_thumbnail_file(
+                thumbnailer, processed[options_key], thumbnail_options,
+            )
+    else:
+        thumbnails = [
+            thumbnailer.generate_thumbnail(thumbnail_options)
+            for thumbnailer, thumbnail_options in jobs
+        ]
+
+    for (thumbnailer, thumbnail_options), thumbnail in zip(jobs, thumbnails):
+        thumbnailer.save_thumbnail(thumbnail)
+    return thumbnails
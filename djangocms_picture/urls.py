@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'djangocms_picture'
+
+urlpatterns = [
+    path('thumbnails/<str:token>/', views.thumbnail, name='thumbnail'),
+]
@@ -0,0 +1,143 @@
+import hashlib
+import re
+
+from django.apps import apps
+from django.core.signing import BadSignature
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+)
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import deferred
+from .conf import get_settings
+from .thumbnails import get_mime_type
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# thumbnail URLs containing the hash of the current source never change
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def thumbnail(request, token):
+    """
+    Generates the thumbnail of a thumbnail URL if missing and serves it
+    (``DJANGOCMS_PICTURE_SERVE_THUMBNAILS``) or redirects to it.
+    """
+    try:
+        model_label, pk, sha1, extension, thumbnail_options = deferred.load_token(token)
+        model = apps.get_model(model_label)
+    except (BadSignature, LookupError, ValueError):
+        raise Http404
+    instance = get_object_or_404(
+        model.objects.select_related('picture', 'thumbnail_options'),
+        pk=pk,
+    )
+    thumbnail = instance.generate_thumbnail(thumbnail_options, extension)
+    if not thumbnail:
+        # another worker is still generating it
+        response = HttpResponse(status=503)
+        response['Retry-After'] = '1'
+        return response
+    if not deferred.is_serving_enabled():
+        return HttpResponseRedirect(thumbnail.url)
+    response = serve(request, thumbnail.storage, thumbnail.name)
+    if response.status_code in (200, 206, 304):
+        # a replaced image gets new URLs
+        current = sha1 and sha1 == instance.get_source_sha1()
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if current else 'no-cache'
+    return response
+
+
+def get_etag(name, size, modified):
+    # strong, the file under a name only changes along with its size or
+    # modification time
+    data = repr((name, size, modified))
+    return '"{}"'.format(hashlib.sha1(data.encode()).hexdigest())
+
+
+def get_range(request, size, etag, last_modified):
+    """
+    Returns the ``(start, end)`` of the single byte range requested, ``None``
+    for the whole file. Raises ``ValueError`` for unsatisfiable ranges.
+    """
+    header = request.headers.get('Range', '')
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        # no range, or several which are not worth supporting for images
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range not in (etag, last_modified and http_date(last_modified)):
+        # the file changed, send all of it
+        return None
+    start, end = match.groups()
+    if not start:
+        # the last ``end`` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError('Unsatisfiable range {}'.format(header))
+    return start, end
+
+
+def serve(request, storage, name):
+    """
+    Serves a file of ``storage`` with validators, answering conditional and
+    range requests, or hands it over to the web server as configured by
+    ``DJANGOCMS_PICTURE_SERVE_THUMBNAILS_OFFLOAD``.
+    """
+    try:
+        size = storage.size(name)
+    except OSError:
+        raise Http404
+    try:
+        last_modified = int(storage.get_modified_time(name).timestamp())
+    except (NotImplementedError, OSError):
+        last_modified = None
+    etag = get_etag(name, size, last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_file_response(request, storage, name, size, etag, last_modified)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def get_file_response(request, storage, name, size, etag, last_modified):
+    content_type = get_mime_type(name.rsplit('.', 1)[-1].lower())
+    offload = get_settings().serve_thumbnails_offload
+    if offload == 'x-accel-redirect':
+        # an internal location of nginx pointing to the storage root
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = '{}{}'.format(
+            get_settings().serve_thumbnails_offload_prefix,
+            name,
+        )
+        return response
+    if offload == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = storage.path(name)
+        return response
+
+    try:
+        byte_range = get_range(request, size, etag, last_modified)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+        return response
+    if byte_range is None:
+        response = FileResponse(storage.open(name), content_type=content_type)
+    else:
+        start, end = byte_range
+        with storage.open(name) as file:
+            file.seek(start)
+            response = HttpResponse(file.read(end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -24,11 +24,12 @@ def create_image(mode="RGB", size=(800, 600)):
     return image
 
 
-def get_image(image_name="test_file.jpg", size=(800, 600)):
+def get_image(image_name="test_file.jpg", size=(800, 600), orientation=None):
     """
     Creates and stores an image to the file system using PILImage
 
     :param image_name: the name for the file (default "test_file.jpg")
+    :param orientation: optionally the EXIF orientation of the image
     :returns: dict {name, image, path}
     """
     image = create_image(size=size)
@@ -36,7 +37,10 @@ def get_image(image_name="test_file.jpg", size=(800, 600)):
         mkdtemp(),
         image_name,
     )
-    image.save(image_path, "JPEG")
+    exif = image.getexif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(image_path, "JPEG", exif=exif)
 
     return {
         "name": image_name,
@@ -65,14 +69,15 @@ def get_file(file_name="test_file.pdf"):
     }
 
 
-def get_filer_image(image_name="test_file.jpg", size=(800, 600)):
+def get_filer_image(image_name="test_file.jpg", size=(800, 600), orientation=None):
     """
     Creates and stores an image to filer and returns it
 
     :param image_name: the name for the file (default "test_file.jpg")
+    :param orientation: optionally the EXIF orientation of the image
     :returns: filer image instance
     """
-    image = get_image(image_name, size)
+    image = get_image(image_name, size, orientation)
     filer_file = File(
         open(image.get("path"), "rb"),
         name=image.get("name"),
@@ -0,0 +1,103 @@
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from filer.utils.compatibility import PILImage
+
+from djangocms_picture.external import get_image_size
+from djangocms_picture.models import Picture
+
+from .helpers import get_filer_image
+
+
+class WarmThumbnailsCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.image = get_filer_image()
+        self.pictures = [
+            Picture.objects.create(picture=self.image, width=width)
+            for width in (700, 500)
+        ]
+        Picture.objects.create(external_picture="https://www.google.com/images/logo.png")
+
+    def tearDown(self):
+        self.image.delete()
+
+    def call_command(self, *args):
+        output = StringIO()
+        call_command("picture_warm_thumbnails", "--workers=0", *args, stdout=output, stderr=output)
+        return output.getvalue()
+
+    def test_dry_run(self):
+        output = self.call_command("--dry-run")
+        self.assertIn("Processing 2 pictures", output)
+        # 700px: main thumbnail + 576px breakpoint, 500px: main thumbnail only
+        self.assertIn("3 thumbnails missing for 2 pictures", output)
+        for picture in self.pictures:
+            picture.refresh_from_db()
+            self.assertEqual(len(picture.get_missing_thumbnails()), len(picture.get_required_thumbnails()))
+
+    def test_warm_thumbnails(self):
+        output = self.call_command("--batch-size=1")
+        self.assertIn("Processed 2 / 2 pictures (last id {})".format(self.pictures[1].pk), output)
+        self.assertIn("3 thumbnails generated for 2 pictures", output)
+        for picture in self.pictures:
+            picture.refresh_from_db()
+            self.assertEqual(picture.get_missing_thumbnails(), [])
+        # running again does not generate anything
+        self.assertIn("0 thumbnails generated for 2 pictures", self.call_command())
+
+    def test_start_after(self):
+        output = self.call_command("--start-after={}".format(self.pictures[0].pk))
+        self.assertIn("Processing 1 pictures", output)
+
+
+@override_settings(DJANGOCMS_PICTURE_EXTERNAL_PROBER="tests.test_commands.probe_external")
+class ProbeExternalCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.pictures = [
+            Picture.objects.create(external_picture="https://example.com/{}.jpg".format(name))
+            for name in ("image", "image", "missing")
+        ]
+
+    def test_probe_external(self):
+        output = StringIO()
+        call_command("picture_probe_external", stdout=output, stderr=output)
+        self.assertIn("Failed to probe https://example.com/missing.jpg", output.getvalue())
+        self.assertIn("Probed 2 URLs, updated 2 pictures", output.getvalue())
+        for picture in self.pictures[:2]:
+            picture.refresh_from_db()
+            self.assertEqual(picture.get_intrinsic_dimensions(), (1200, 900))
+            self.assertEqual(picture.img_dimensions["height"], 900)
+        self.assertIsNone(self.pictures[2].get_intrinsic_dimensions())
+        # the dimensions belong to the URL
+        self.pictures[0].external_picture = "https://example.com/other.jpg"
+        self.pictures[0].save()
+        self.assertIsNone(self.pictures[0].get_intrinsic_dimensions())
+
+    def test_image_size_from_header(self):
+        for format in ("JPEG", "PNG", "GIF", "WEBP"):
+            content = BytesIO()
+            PILImage.effect_noise((400, 300), 64).convert("RGB").save(content, format)
+            data = content.getvalue()
+            self.assertGreater(len(data), 4096)
+            self.assertEqual(get_image_size(data[:4096]), (400, 300), format)
+        for mode, lossless in (("RGB", True), ("RGBA", False)):
+            content = BytesIO()
+            PILImage.effect_noise((400, 300), 64).convert(mode).save(content, "WEBP", lossless=lossless)
+            self.assertEqual(get_image_size(content.getvalue()[:100]), (400, 300), mode)
+        avif = (
+            b"\x00\x00\x00\x1cftypavif\x00\x00\x00\x00avifmif1miaf"
+            b"\x00\x00\x00\x14ispe\x00\x00\x00\x00\x00\x00\x01\x90\x00\x00\x01\x2c"
+        )
+        self.assertEqual(get_image_size(avif), (400, 300))
+        self.assertIsNone(get_image_size(avif[:40]))
+        self.assertIsNone(get_image_size(b"<html>"))
+
+
+def probe_external(url):
+    if url.endswith("missing.jpg"):
+        raise OSError("Not found")
+    return (1200, 900)
@@ -1,10 +1,18 @@
 # original from
 # http://tech.octopus.energy/news/2016/01/21/testing-for-missing-migrations-in-django.html
+from importlib import import_module
 from io import StringIO
 
+from django.apps import apps
 from django.core.management import call_command
 from django.test import TestCase, override_settings
 
+from filer.models.imagemodels import Image as FilerImage
+
+from djangocms_picture.models import Picture
+
+from .helpers import get_filer_image
+
 
 class MigrationTestCase(TestCase):
 
@@ -28,3 +36,28 @@ class MigrationTestCase(TestCase):
 
         if status_code == '1':
             self.fail('There are missing migrations:\n {}'.format(output.getvalue()))
+
+
+class DataMigrationTestCase(TestCase):
+
+    def test_fill_source_fields(self):
+        migration = import_module('djangocms_picture.migrations.0013_picture_source_fields')
+        picture = Picture.objects.create(picture=get_filer_image())
+        turned = Picture.objects.create(picture=get_filer_image(orientation=6))
+        unknown = Picture.objects.create(picture=get_filer_image())
+        FilerImage.objects.filter(pk=unknown.picture_id).update(_width=None, _height=None)
+        Picture.objects.update(
+            source_width=None, source_height=None, source_sha1='', source_modified=None,
+        )
+
+        migration.fill_source_fields(apps, None)
+        picture.refresh_from_db()
+        self.assertEqual((picture.source_width, picture.source_height), (800, 600))
+        self.assertEqual(picture.source_sha1, picture.picture.sha1)
+        # the dimensions of the image as displayed
+        turned.refresh_from_db()
+        self.assertEqual((turned.source_width, turned.source_height), (600, 800))
+        # unknown dimensions stay unknown
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.source_width, unknown.source_height), (None, None))
+        self.assertIsNotNone(unknown.source_modified)
@@ -1,15 +1,21 @@
-from django.conf import settings
+from unittest import mock
+
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from cms.api import create_page
 
-from easy_thumbnails.files import ThumbnailFile
+from easy_thumbnails.files import Thumbnailer, ThumbnailFile
+from filer.utils.compatibility import PILImage
 from filer.models import ThumbnailOption
 
+from djangocms_picture import cache as thumbnail_cache
+from djangocms_picture.conf import get_settings
+from djangocms_picture.encoding import thumbnail_encoded
+from djangocms_picture.locks import get_lock_key
 from djangocms_picture.models import (
     LINK_TARGET, PICTURE_RATIO, RESPONSIVE_IMAGE_CHOICES, Picture,
-    get_alignment, get_templates,
+    get_alignment, get_source_fields, get_templates,
 )
 
 from .helpers import get_filer_image
@@ -62,10 +68,22 @@ class PictureModelTestCase(TestCase):
 
     def test_settings(self):
         self.assertEqual(get_templates(), [('default', 'Default')])
-        settings.DJANGOCMS_PICTURE_TEMPLATES = [('feature', 'Feature')]
-        self.assertEqual(get_templates(), [('default', 'Default'), ('feature', 'Feature')])
+        with override_settings(DJANGOCMS_PICTURE_TEMPLATES=[('feature', 'Feature')]):
+            self.assertEqual(get_templates(), [('default', 'Default'), ('feature', 'Feature')])
+        self.assertEqual(get_templates(), [('default', 'Default')])
 
         self.assertEqual(PICTURE_RATIO, 1.6180)
+        with override_settings(
+            DJANGOCMS_PICTURE_RATIO=2,
+            DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_VIEWPORT_BREAKPOINTS=[992, 576],
+        ):
+            self.assertEqual(get_settings().ratio, 2)
+            self.assertEqual(get_settings().responsive_images_viewport_breakpoints, (576, 992))
+        self.assertIs(get_settings(), get_settings())
+        # the in-process thumbnail cache is sized by the settings
+        with override_settings(DJANGOCMS_PICTURE_THUMBNAIL_LOCAL_CACHE_SIZE=10):
+            self.assertEqual(thumbnail_cache.get_local_cache().maxsize, 10)
+        self.assertEqual(thumbnail_cache.get_local_cache().maxsize, 1000)
         self.assertEqual(
             get_alignment(),
             (('left', 'Align left'), ('right', 'Align right'), ('center', 'Align center')),
@@ -211,9 +229,45 @@ class PictureModelTestCase(TestCase):
             instance.img_srcset_data[0][1],
             ThumbnailFile,
         )
+        # candidates keep the aspect ratio of the picture, which is scaled
+        # to 640x480 to fit 720x480
+        self.assertEqual(
+            [(size, thumb.width, thumb.height) for size, thumb in instance.img_srcset_data],
+            [(576, 576, 432)],
+        )
+        instance.use_crop = True
+        self.assertEqual(
+            [(size, thumb.width, thumb.height) for size, thumb in instance.img_srcset_data],
+            [(576, 576, 384)],
+        )
         instance.external_picture = self.external_picture
         self.assertIsNone(instance.img_srcset_data)
 
+    def test_unknown_source_size(self):
+        instance = Picture.objects.get(pk=self.picture.pk)
+        instance.width = 500
+        instance.source_width = instance.source_height = None
+        instance.picture._width = instance.picture._height = None
+        # no candidates without the dimensions of the image
+        self.assertEqual(instance.img_srcset_data, [])
+        self.assertIn("/media/filer_public_thumbnails/filer_public/", instance.img_src)
+        self.assertEqual(instance.img_dimensions["width"], 500)
+        instance.responsive_image_mode = "density"
+        instance.use_responsive_image = "yes"
+        self.assertEqual(instance.img_density_srcset, [])
+
+    @override_settings(ROOT_URLCONF="tests.urls")
+    def test_unknown_source_size_deferred(self):
+        for setting in ("DJANGOCMS_PICTURE_DEFERRED_THUMBNAILS", "DJANGOCMS_PICTURE_SERVE_THUMBNAILS"):
+            with self.subTest(setting), override_settings(**{setting: True}):
+                instance = Picture.objects.get(pk=self.picture.pk)
+                instance.width = 500
+                instance.source_width = instance.source_height = None
+                instance.picture._width = instance.picture._height = None
+                # generated right away, the dimensions can't be computed in advance
+                self.assertIn("/media/filer_public_thumbnails/filer_public/", instance.img_src)
+                self.assertEqual(instance.img_dimensions["width"], 500)
+
     def test_img_src(self):
         instance = self.picture
         # thumbnail is generated
@@ -231,3 +285,305 @@ class PictureModelTestCase(TestCase):
         self.assertEqual(instance.img_src, "")
         instance.external_picture = self.external_picture
         self.assertEqual(instance.img_src, self.external_picture)
+
+    def test_render_plan(self):
+        instance = self.picture
+        with mock.patch.object(Thumbnailer, "get_existing_thumbnail", autospec=True,
+                               side_effect=Thumbnailer.get_existing_thumbnail) as get_existing_thumbnail:
+            img_src = instance.img_src
+            srcset = instance.img_srcset_data
+            self.assertEqual(instance.img_src, img_src)
+            self.assertIs(instance.img_srcset_data, srcset)
+            # one lookup for the main thumbnail and one per breakpoint
+            self.assertEqual(get_existing_thumbnail.call_count, 1 + len(srcset))
+            # changing a field invalidates the plan
+            instance.use_crop = True
+            self.assertNotEqual(instance.img_src, img_src)
+            self.assertEqual(get_existing_thumbnail.call_count, 2 + 2 * len(srcset))
+        self.assertIsNot(instance.get_size(), instance.get_size())
+
+    def test_generation_lock(self):
+        instance = Picture.objects.get(pk=self.picture.pk)
+        instance.use_responsive_image = "yes"
+        lock_key = get_lock_key(instance.get_thumbnailer(), instance.get_source_sha1())
+        # another process generates the thumbnails of the image
+        thumbnail_cache.get_cache().add(lock_key, "other", timeout=60)
+        with self.settings(DJANGOCMS_PICTURE_THUMBNAIL_LOCK_WAIT=0):
+            with mock.patch("djangocms_picture.models.generate_thumbnail_set") as generate_thumbnail_set:
+                self.assertEqual(instance.img_src, instance.picture.url)
+                self.assertEqual(instance.img_srcset_data, [])
+                self.assertIsNone(instance.img_dimensions["intrinsic_width"])
+                # nothing is reported as generated
+                self.assertEqual(instance.generate_thumbnails(), 0)
+            generate_thumbnail_set.assert_not_called()
+            # the lock is released or has expired
+            thumbnail_cache.get_cache().delete(lock_key)
+            instance = Picture.objects.get(pk=self.picture.pk)
+            self.assertIn("/media/filer_public_thumbnails/", instance.img_src)
+        self.assertIsNone(thumbnail_cache.get_cache().get(lock_key))
+
+    @override_settings(DJANGOCMS_PICTURE_DEFERRED_THUMBNAILS=True, ROOT_URLCONF="tests.urls")
+    def test_deferred_thumbnails(self):
+        instance = Picture.objects.get(pk=self.picture.pk)
+        with mock.patch("djangocms_picture.models.generate_thumbnail_set") as generate_thumbnail_set:
+            img_src = instance.img_src
+            srcset = instance.img_srcset_data
+            dimensions = instance.img_dimensions
+        generate_thumbnail_set.assert_not_called()
+        self.assertTrue(img_src.startswith("/picture/thumbnails/"))
+        # the URLs are deterministic
+        self.assertEqual(Picture.objects.get(pk=self.picture.pk).img_src, img_src)
+
+        # the view generates the thumbnail and redirects to it
+        response = self.client.get(img_src)
+        self.assertEqual(response.status_code, 302)
+        instance = Picture.objects.get(pk=self.picture.pk)
+        self.assertEqual(response["Location"], instance.img_src)
+        self.assertIn("/media/filer_public_thumbnails/", instance.img_src)
+        # the dimensions were computed in advance
+        self.assertEqual(instance.img_dimensions, dimensions)
+        for size, thumbnail in srcset:
+            self.assertEqual(self.client.get(thumbnail.url).status_code, 302)
+        self.assertEqual(
+            [(size, thumbnail.width, thumbnail.height) for size, thumbnail in instance.img_srcset_data],
+            [(size, thumbnail.width, thumbnail.height) for size, thumbnail in srcset],
+        )
+        self.assertEqual(self.client.get(img_src[:-2] + "/").status_code, 404)
+
+    @override_settings(DJANGOCMS_PICTURE_DEFERRED_THUMBNAILS=True, ROOT_URLCONF="tests.urls")
+    def test_exif_orientation(self):
+        # stored as 800x600, displayed turned to 600x800
+        image = get_filer_image(size=(800, 600), orientation=6)
+        instance = Picture.objects.create(picture=image, width=400)
+        self.assertEqual((instance.source_width, instance.source_height), (600, 800))
+        instance = Picture.objects.get(pk=instance.pk)
+        self.assertEqual(
+            (instance.img_dimensions["width"], instance.img_dimensions["height"]), (400, 533),
+        )
+        self.assertEqual(instance.img_dimensions["aspect_ratio"], "400 / 533")
+        # the generated thumbnail matches the predicted dimensions
+        thumbnail = instance.generate_thumbnail(instance.get_img_src_thumbnail_options())
+        self.assertEqual((thumbnail.width, thumbnail.height), (400, 533))
+        image.delete()
+
+    @override_settings(DJANGOCMS_PICTURE_HASHED_THUMBNAIL_NAMES=True, DJANGOCMS_PICTURE_FORMATS=["webp"])
+    def test_hashed_thumbnail_names(self):
+        instance = Picture.objects.get(pk=self.picture.pk)
+        img_src = instance.img_src
+        self.assertRegex(
+            img_src,
+            r"^/media/filer_public_thumbnails/djangocms_picture/thumbnails/[0-9a-f]{2}/[0-9a-f]{40}\.jpg$",
+        )
+        self.assertRegex(instance.img_sources[0]["src"].url, r"/[0-9a-f]{40}\.webp$")
+        # names only depend on the content of the source and the options
+        self.assertEqual(Picture.objects.get(pk=self.picture.pk).img_src, img_src)
+        instance = Picture.objects.get(pk=self.picture.pk)
+        instance.width = 600
+        self.assertNotEqual(instance.img_src, img_src)
+        instance = Picture.objects.get(pk=self.picture.pk)
+        instance.picture.sha1 = "0" * 40
+        self.assertNotEqual(instance.img_src, img_src)
+        # existing thumbnails are found without comparing modification times
+        instance = Picture.objects.get(pk=self.picture.pk)
+        with mock.patch("djangocms_picture.models.generate_thumbnail_set") as generate_thumbnail_set:
+            thumbnail_cache.get_local_cache().clear()
+            thumbnail_cache.get_cache().clear()
+            self.assertEqual(instance.img_src, img_src)
+        generate_thumbnail_set.assert_not_called()
+
+    def test_thumbnail_set(self):
+        instance = Picture.objects.create(
+            picture=get_filer_image(size=(4800, 3200)),
+            use_automatic_scaling=False,
+            width=600,
+            use_crop=True,
+        )
+        instance.picture.subject_location = "2400,1600"
+        opened = []
+        pil_open = PILImage.open
+
+        def image_open(*args):
+            opened.append(pil_open(*args))
+            return opened[-1]
+
+        with mock.patch("djangocms_picture.thumbnails.Image.open", side_effect=image_open):
+            self.assertEqual(instance.generate_thumbnails(), 2)
+        # the source is decoded only once, at a reduced scale
+        self.assertEqual([image.size for image in opened], [(2400, 1600)])
+        thumbnails = instance.get_thumbnails(instance.get_required_thumbnail_options())
+        self.assertEqual(
+            [thumbnail.image.size for thumbnail in thumbnails],
+            [(600, 370), (576, 355)],
+        )
+        self.assertEqual(instance.generate_thumbnails(), 0)
+
+    def test_picture_formats(self):
+        instance = self.picture
+        self.assertEqual(instance.img_sources, [])
+        with self.settings(DJANGOCMS_PICTURE_FORMATS=["webp", "unknown"]):
+            instance = Picture.objects.get(pk=self.picture.pk)
+            # unsupported formats are skipped
+            self.assertEqual(instance.get_picture_formats(), ["webp"])
+            sources = instance.img_sources
+            self.assertEqual(len(sources), 1)
+            self.assertEqual(sources[0]["type"], "image/webp")
+            self.assertTrue(sources[0]["src"].name.endswith(".webp"))
+            self.assertEqual(sources[0]["src"].image.size, instance.get_thumbnail(
+                instance.get_img_src_thumbnail_options()).image.size)
+            self.assertEqual(
+                [(size, thumb.width) for size, thumb in sources[0]["srcset"]],
+                [(size, thumb.width) for size, thumb in instance.img_srcset_data],
+            )
+            self.assertEqual(instance.get_missing_thumbnails(), [])
+            instance.use_no_cropping = True
+            self.assertEqual(instance.img_sources, [])
+
+    def test_encoding_profiles(self):
+        profiles = {
+            "hero": {"quality": {"jpeg": 95, "webp": 90}, "progressive": True, "webp_method": 6},
+            "small": {"quality": 40},
+        }
+        encoded = []
+
+        def receiver(**kwargs):
+            encoded.append((kwargs["format"], kwargs["profile"], kwargs["bytes"]))
+
+        thumbnail_encoded.connect(receiver)
+        self.addCleanup(thumbnail_encoded.disconnect, receiver)
+        with self.settings(DJANGOCMS_PICTURE_ENCODING_PROFILES=profiles,
+                           DJANGOCMS_PICTURE_TEMPLATE_ENCODING_PROFILES={"default": "hero"},
+                           DJANGOCMS_PICTURE_FORMATS=["webp"]):
+            instance = Picture.objects.get(pk=self.picture.pk)
+            self.assertEqual(instance.get_encoding_profile(), "hero")
+            self.assertIn("encoding-hero", instance.img_src)
+            self.assertEqual(
+                {(format, profile) for format, profile, size in encoded},
+                {("JPEG", "hero"), ("WEBP", "hero")},
+            )
+            hero_bytes = sum(size for format, profile, size in encoded if format == "JPEG")
+
+            with self.settings(DJANGOCMS_PICTURE_TEMPLATE_ENCODING_PROFILES={"default": "small"}):
+                encoded.clear()
+                instance = Picture.objects.get(pk=self.picture.pk)
+                self.assertIn("encoding-small", instance.img_src)
+                small_bytes = sum(size for format, profile, size in encoded if format == "JPEG")
+                self.assertLess(small_bytes, hero_bytes)
+
+            # thumbnail options take precedence over the template
+            option = ThumbnailOption.objects.create(name="Thumb", width=100, height=100)
+            with self.settings(DJANGOCMS_PICTURE_THUMBNAIL_OPTION_ENCODING_PROFILES={"Thumb": "small"}):
+                instance.thumbnail_options = option
+                self.assertEqual(instance.get_encoding_profile(), "small")
+        self.assertIsNone(instance.get_encoding_profile())
+
+    def test_img_density_srcset(self):
+        instance = self.picture
+        instance.use_responsive_image = "yes"
+        instance.responsive_image_mode = "density"
+        self.assertIsNone(instance.img_srcset_data)
+        # the 640x480 picture can only be enlarged to the 800x600 source
+        self.assertEqual(
+            [(density, thumb.width) for density, thumb in instance.img_density_srcset],
+            [("1.25", 800)],
+        )
+        instance.use_upscale = True
+        self.assertEqual(
+            [(density, thumb.width) for density, thumb in instance.img_density_srcset],
+            [("2", 1280), ("3", 1920)],
+        )
+        with self.settings(DJANGOCMS_PICTURE_RESPONSIVE_IMAGES_MODE="density"):
+            instance.responsive_image_mode = "inherit"
+            self.assertEqual(len(instance.img_density_srcset), 2)
+        instance.responsive_image_mode = "width"
+        self.assertIsNone(instance.img_density_srcset)
+
+    def test_img_dimensions(self):
+        instance = self.picture
+        # the dimensions set by the editor are kept
+        self.assertEqual(
+            instance.img_dimensions,
+            {"width": 720, "height": 480, "intrinsic_width": 640, "intrinsic_height": 480,
+             "aspect_ratio": "640 / 480"},
+        )
+        # the dimensions are taken from the cache along with the thumbnail
+        instance = Picture.objects.get(pk=self.picture.pk)
+        with mock.patch.object(ThumbnailFile, "open") as thumbnail_open:
+            self.assertEqual(instance.img_dimensions["aspect_ratio"], "640 / 480")
+        thumbnail_open.assert_not_called()
+        instance.width = instance.height = None
+        self.assertEqual(
+            instance.img_dimensions,
+            {"width": 800, "height": 600, "intrinsic_width": 800, "intrinsic_height": 600,
+             "aspect_ratio": "800 / 600"},
+        )
+        # missing dimensions are completed according to the aspect ratio
+        instance.width = 400
+        self.assertEqual(instance.img_dimensions["height"], 300)
+        instance.external_picture = self.external_picture
+        self.assertEqual(
+            instance.img_dimensions,
+            {"width": 400, "height": None, "intrinsic_width": None, "intrinsic_height": None,
+             "aspect_ratio": None},
+        )
+
+    def test_source_fields(self):
+        instance = self.picture
+        self.assertEqual((instance.source_width, instance.source_height), (800, 600))
+        self.assertEqual(instance.source_sha1, instance.picture.sha1)
+        instance.refresh_from_db()
+        # sizes are computed without loading the filer image
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                instance.get_size(),
+                {"size": (800, 600), "crop": False, "upscale": False},
+            )
+        # changes of the filer image are synced
+        image = instance.picture
+        image.subject_location = "100,100"
+        image.save()
+        instance.refresh_from_db()
+        self.assertEqual(instance.source_subject_location, "100,100")
+        self.assertEqual(instance.get_img_src_thumbnail_options()["subject_location"], "100,100")
+        # as are the responsive candidates cropped around it
+        srcset = instance.get_srcset_thumbnail_options()
+        self.assertTrue(srcset)
+        for size, thumbnail_options in srcset:
+            self.assertEqual(thumbnail_options["subject_location"], "100,100")
+            self.assertEqual(thumbnail_options["upscale"], instance.get_size()["upscale"])
+        # images used by no picture are not read again
+        unused = get_filer_image()
+        with mock.patch("djangocms_picture.signals.get_source_fields") as fields:
+            unused.save()
+        fields.assert_not_called()
+        unused.delete()
+        # unknown dimensions are not stored as 0
+        image._width = image._height = None
+        self.assertEqual(get_source_fields(image)["source_width"], None)
+        self.assertEqual(get_source_fields(image)["source_height"], None)
+        # removing the image clears them
+        instance.picture = None
+        instance.save()
+        self.assertIsNone(instance.source_width)
+        self.assertEqual(instance.source_sha1, "")
+
+    def test_thumbnail_cache(self):
+        img_src = self.picture.img_src
+        srcset = self.picture.img_srcset_data
+        thumbnail_cache.get_local_cache().clear()
+        with mock.patch.object(Thumbnailer, "get_existing_thumbnail", autospec=True,
+                               side_effect=Thumbnailer.get_existing_thumbnail) as get_existing_thumbnail:
+            instance = Picture.objects.get(pk=self.picture.pk)
+            self.assertEqual(instance.img_src, img_src)
+            self.assertEqual(
+                [(size, thumb.url, thumb.width) for size, thumb in instance.img_srcset_data],
+                [(size, thumb.url, thumb.width) for size, thumb in srcset],
+            )
+            self.assertEqual(get_existing_thumbnail.call_count, 0)
+            # a new image content is not found in the cache
+            instance = Picture.objects.get(pk=self.picture.pk)
+            instance.picture.sha1 = "0" * 40
+            self.assertEqual(instance.img_src, img_src)
+            self.assertEqual(get_existing_thumbnail.call_count, 1 + len(srcset))
+
+        with self.settings(DJANGOCMS_PICTURE_THUMBNAIL_CACHE=None):
+            self.assertEqual(thumbnail_cache.get_many(["key"]), {})
@@ -1,8 +1,20 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.template import Context
+from django.test import RequestFactory, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+
 from cms.api import add_plugin, create_page
 from cms.test_utils.testcases import CMSTestCase
+from cms.utils.plugins import downcast_plugins
+
+from sekizai.context_processors import sekizai
 
 from djangocms_picture.cms_plugins import PicturePlugin
-from djangocms_picture.models import get_alignment
+from djangocms_picture.models import Picture, get_alignment
+from djangocms_picture.preload import get_preload_block
 
 from .helpers import get_filer_image
 
@@ -76,3 +88,226 @@ class PicturePluginsTestCase(CMSTestCase):
             response = self.client.get(request_url)
 
         self.assertContains(response, 'align-right')
+
+    def test_style_attribute(self):
+        request_url = self.page.get_absolute_url(self.language) + "?toolbar_off=true"
+        add_plugin(
+            placeholder=self.placeholder,
+            plugin_type=PicturePlugin.__name__,
+            language=self.language,
+            picture=self.picture,
+            attributes={"style": "border: 1px solid red;"},
+        )
+        self.page.publish(self.language)
+
+        response = self.client.get(request_url)
+        # the aspect ratio is kept along with the style of the editor
+        self.assertContains(response, 'style="aspect-ratio: 800 / 600; border: 1px solid red;"', count=1)
+
+    @override_settings(DJANGOCMS_PICTURE_EAGER_PICTURES=2)
+    def test_loading_attributes(self):
+        request_url = self.page.get_absolute_url(self.language) + "?toolbar_off=true"
+        for loading, fetch_priority in [("auto", "auto")] * 3 + [("eager", "low")]:
+            add_plugin(
+                placeholder=self.placeholder,
+                plugin_type=PicturePlugin.__name__,
+                language=self.language,
+                picture=self.picture,
+                loading=loading,
+                fetch_priority=fetch_priority,
+            )
+        self.page.publish(self.language)
+
+        response = self.client.get(request_url)
+        # leaving out the preload in the head
+        content = response.content.decode().split("</head>", 1)[1]
+        # the first pictures of the first placeholder are loaded eagerly
+        self.assertEqual(content.count('loading="eager"'), 3)
+        self.assertEqual(content.count('fetchpriority="high"'), 2)
+        self.assertEqual(content.count('fetchpriority="low"'), 1)
+        self.assertEqual(content.count('loading="lazy"'), 1)
+        self.assertEqual(content.count('decoding="async"'), 1)
+
+    @modify_settings(MIDDLEWARE={"append": "djangocms_picture.middleware.PreloadMiddleware"})
+    @override_settings(DJANGOCMS_PICTURE_RESPONSIVE_IMAGES=True)
+    def test_preload_header(self):
+        request_url = self.page.get_absolute_url(self.language) + "?toolbar_off=true"
+        for index in range(2):
+            add_plugin(
+                placeholder=self.placeholder,
+                plugin_type=PicturePlugin.__name__,
+                language=self.language,
+                picture=self.picture,
+            )
+        self.page.publish(self.language)
+
+        response = self.client.get(request_url)
+        # only the first picture is preloaded
+        link = response["Link"]
+        self.assertEqual(link.count("rel=preload; as=image"), 1)
+        self.assertRegex(link, r"^</media/filer_public_thumbnails/filer_public/.+>; rel=preload")
+        self.assertIn('imagesrcset="/media/', link)
+        self.assertIn('imagesizes="(max-width: 576px) 576px, ', link)
+        self.assertTrue(link.endswith("fetchpriority=high"))
+        # along with a tag in the head of the page
+        content = response.content.decode()
+        self.assertEqual(content.count('<link rel="preload" as="image" href="/media/'), 1)
+        self.assertLess(content.index('rel="preload"'), content.index("</head>"))
+        # the page and placeholder caches keep it
+        with mock.patch.object(PicturePlugin, "render_picture") as render_picture:
+            for url in (request_url, request_url + "&x=1"):
+                response = self.client.get(url)
+                self.assertEqual(response["Link"], link)
+                self.assertContains(response, '<link rel="preload" as="image"', count=1)
+        render_picture.assert_not_called()
+
+    @override_settings(
+        DJANGOCMS_PICTURE_RESPONSIVE_IMAGES=True,
+        CMS_PLACEHOLDER_CONF={
+            "content": {"extra_context": {"picture_columns": [(576, "100vw"), (None, 400)]}},
+        },
+    )
+    def test_placeholder_sizes(self):
+        request_url = self.page.get_absolute_url(self.language) + "?toolbar_off=true"
+        add_plugin(
+            placeholder=self.placeholder,
+            plugin_type=PicturePlugin.__name__,
+            language=self.language,
+            picture=self.picture,
+        )
+        self.page.publish(self.language)
+
+        response = self.client.get(request_url)
+        self.assertContains(response, 'sizes="(max-width: 576px) 100vw, 400px"')
+
+    @modify_settings(MIDDLEWARE={"append": "djangocms_picture.middleware.ClientHintsMiddleware"})
+    @override_settings(
+        DJANGOCMS_PICTURE_CLIENT_HINTS=True,
+        DJANGOCMS_PICTURE_RESPONSIVE_IMAGES=True,
+        DJANGOCMS_PICTURE_ENCODING_PROFILES={"save-data": {"quality": 40}},
+        DJANGOCMS_PICTURE_SAVE_DATA_ENCODING_PROFILE="save-data",
+        CMS_PAGE_CACHE=False,
+    )
+    def test_client_hints(self):
+        request_url = self.page.get_absolute_url(self.language) + "?toolbar_off=true"
+        add_plugin(
+            placeholder=self.placeholder,
+            plugin_type=PicturePlugin.__name__,
+            language=self.language,
+            picture=self.picture,
+        )
+        self.page.publish(self.language)
+
+        response = self.client.get(request_url)
+        self.assertIn("Sec-CH-DPR", response["Accept-CH"])
+        self.assertIn("save-data", response["Vary"].lower())
+        # without hints the srcset is rendered
+        self.assertContains(response, "srcset=")
+
+        # a 500px viewport gets the 576px candidate
+        response = self.client.get(request_url, HTTP_SEC_CH_VIEWPORT_WIDTH="500")
+        self.assertNotContains(response, "srcset=")
+        self.assertContains(response, "576x0")
+        # the main image on a 2x screen
+        response = self.client.get(request_url, HTTP_SEC_CH_VIEWPORT_WIDTH="500", HTTP_SEC_CH_DPR="2")
+        self.assertContains(response, "800x600")
+        # save data ignores the density and uses the lower quality profile
+        response = self.client.get(
+            request_url, HTTP_SEC_CH_VIEWPORT_WIDTH="500", HTTP_SEC_CH_DPR="2", HTTP_SAVE_DATA="on",
+        )
+        self.assertContains(response, "576x0")
+        self.assertContains(response, "encoding-save-data")
+
+    def test_render_queryset(self):
+        for index in range(3):
+            add_plugin(
+                placeholder=self.placeholder,
+                plugin_type=PicturePlugin.__name__,
+                language=self.language,
+                picture=self.picture,
+                link_page=self.home,
+            )
+        plugins = list(self.placeholder.get_plugins(self.language))
+        with CaptureQueriesContext(connection) as queries:
+            instances = list(downcast_plugins(plugins))
+        # one query for the pictures and one for the titles of linked pages
+        self.assertEqual(len(queries), 2)
+
+        link = self.home.get_absolute_url(self.language)
+        with self.assertNumQueries(0):
+            for instance in instances:
+                self.assertEqual(instance.picture, self.picture)
+                self.assertIsNone(instance.thumbnail_options)
+                self.assertEqual(instance.get_link(), link)
+
+    @override_settings(
+        DJANGOCMS_PICTURE_RENDER_CACHE="default",
+        CMS_PAGE_CACHE=False,
+        CMS_PLACEHOLDER_CACHE=False,
+    )
+    def test_render_cache(self):
+        cache.clear()
+        request_url = self.page.get_absolute_url(self.language) + "?toolbar_off=true"
+        plugin = add_plugin(
+            placeholder=self.placeholder,
+            plugin_type=PicturePlugin.__name__,
+            language=self.language,
+            picture=self.picture,
+            caption_text="first",
+            link_page=self.home,
+        )
+        self.page.publish(self.language)
+        response = self.client.get(request_url)
+        self.assertContains(response, "first")
+
+        # the second request takes the HTML from the cache
+        with mock.patch.object(PicturePlugin, "render_picture") as render_picture:
+            cached_response = self.client.get(request_url)
+        render_picture.assert_not_called()
+        self.assertEqual(cached_response.content, response.content)
+
+        # changing the picture or the linked page renders it again
+        plugin.caption_text = "second"
+        plugin.save()
+        self.page.publish(self.language)
+        self.assertContains(self.client.get(request_url), "second")
+        self.home.title_set.update(slug="start", path="start")
+        self.assertContains(self.client.get(request_url), 'href="/en/start/"')
+
+    @override_settings(
+        DJANGOCMS_PICTURE_RENDER_CACHE="default",
+        DJANGOCMS_PICTURE_DEFERRED_THUMBNAILS=True,
+        ROOT_URLCONF="tests.urls",
+    )
+    def test_render_cache_deferred(self):
+        cache.clear()
+        plugin = add_plugin(
+            placeholder=self.placeholder,
+            plugin_type=PicturePlugin.__name__,
+            language=self.language,
+            picture=self.picture,
+            fetch_priority="high",
+        )
+
+        def render():
+            context = Context(sekizai())
+            context["request"] = RequestFactory().get("/")
+            instance = Picture.objects.get(pk=plugin.pk)
+            context = PicturePlugin().render(context, instance, self.placeholder)
+            return context["picture_html"], list(get_preload_block(context))
+
+        html, preloads = render()
+        self.assertIn("/picture/thumbnails/", html)
+        # the URLs of the thumbnail view are not cached
+        with mock.patch.object(PicturePlugin, "render_picture", wraps=PicturePlugin().render_picture) as render_picture:
+            render()
+        render_picture.assert_called_once()
+
+        # unless the view serves all thumbnails
+        with override_settings(DJANGOCMS_PICTURE_SERVE_THUMBNAILS=True):
+            html, preloads = render()
+            with mock.patch.object(PicturePlugin, "render_picture") as render_picture:
+                self.assertEqual(render(), (html, preloads))
+            render_picture.assert_not_called()
+        # the preload is added again along with the cached HTML
+        self.assertEqual(len(preloads), 1)
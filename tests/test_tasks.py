@@ -0,0 +1,180 @@
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from easy_thumbnails.files import Thumbnailer
+from filer.models.imagemodels import Image as FilerImage
+from filer.utils.compatibility import PILImage
+
+from djangocms_picture import tasks
+from djangocms_picture.external import FetchResult, get_storage
+from djangocms_picture.models import Picture
+
+from .helpers import get_filer_image
+
+
+class PictureTasksTestCase(TestCase):
+
+    def setUp(self):
+        self.image = get_filer_image()
+
+    def tearDown(self):
+        self.image.delete()
+
+    @override_settings(DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="sync")
+    def test_thumbnails_generated_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            picture = Picture.objects.create(picture=self.image)
+        required = picture.get_required_thumbnail_options()
+        # main thumbnail plus all breakpoints below 800px
+        self.assertEqual(len(required), 3)
+        thumbnailer = picture.get_thumbnailer()
+        for thumbnail_options in required:
+            self.assertIsNotNone(thumbnailer.get_existing_thumbnail(thumbnail_options))
+
+    @override_settings(DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="sync")
+    def test_thumbnails_generated_on_image_change(self):
+        picture = Picture.objects.create(picture=self.image)
+        with mock.patch.object(tasks, "generate_thumbnails") as generate_thumbnails:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.image.subject_location = "10,10"
+                self.image.save()
+        generate_thumbnails.assert_called_once_with("djangocms_picture.Picture", picture.pk)
+
+    @override_settings(DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="sync")
+    def test_placeholder_generated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            picture = Picture.objects.create(picture=self.image)
+        picture.refresh_from_db()
+        self.assertTrue(picture.lqip.startswith("data:image/jpeg;base64,"))
+        self.assertRegex(picture.dominant_color, r"^#[0-9a-f]{6}$")
+        self.assertIn(picture.dominant_color, picture.placeholder_style)
+        # a new image content invalidates the placeholder
+        with mock.patch.object(tasks, "generate_thumbnails"):
+            self.image.sha1 = "0" * 40
+            self.image.save()
+        picture.refresh_from_db()
+        self.assertEqual((picture.lqip, picture.dominant_color), ("", ""))
+
+    @override_settings(DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="sync")
+    def test_transparent_placeholder(self):
+        # a white square on a transparent background
+        image = PILImage.new("RGBA", (100, 100), (0, 0, 0, 0))
+        image.paste((255, 255, 255, 255), (25, 25, 75, 75))
+        data = BytesIO()
+        image.save(data, format="PNG")
+        filer_image = FilerImage.objects.create(
+            original_filename="transparent.png",
+            file=ContentFile(data.getvalue(), name="transparent.png"),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            picture = Picture.objects.create(picture=filer_image)
+        picture.refresh_from_db()
+        # transparent pixels do not count, nothing is painted behind the image
+        self.assertEqual(picture.dominant_color, "#ffffff")
+        self.assertEqual(picture.lqip, "")
+        self.assertEqual(picture.placeholder_style, "")
+        filer_image.delete()
+
+    @override_settings(DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR=None)
+    def test_disabled_executor(self):
+        with mock.patch.object(Thumbnailer, "get_thumbnail") as get_thumbnail:
+            with self.captureOnCommitCallbacks(execute=True):
+                Picture.objects.create(picture=self.image)
+        get_thumbnail.assert_not_called()
+
+    @override_settings(DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="tests.test_tasks.enqueue")
+    def test_custom_executor(self):
+        with mock.patch("tests.test_tasks.enqueue") as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                picture = Picture.objects.create(picture=self.image)
+        enqueue.assert_called_once_with(tasks.generate_thumbnails, "djangocms_picture.Picture", picture.pk)
+
+
+    @override_settings(
+        DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="sync",
+        DJANGOCMS_PICTURE_EXTERNAL_CACHE=True,
+        DJANGOCMS_PICTURE_EXTERNAL_FETCHER="tests.test_tasks.fetch_external",
+    )
+    def test_external_picture_cached(self):
+        with mock.patch("tests.test_tasks.fetch_external", wraps=fetch_external) as fetch:
+            with self.captureOnCommitCallbacks(execute=True):
+                picture = Picture.objects.create(external_picture="https://example.com/image.png")
+        fetch.assert_called_once_with("https://example.com/image.png", etag="", last_modified="")
+        picture.refresh_from_db()
+        self.assertTrue(get_storage().exists(picture.external_file))
+        self.assertEqual((picture.source_width, picture.source_height), (800, 600))
+        self.assertEqual(picture.external_etag, '"v1"')
+        self.assertTrue(picture.dominant_color)
+        # rendered from the thumbnails of the local copy
+        self.assertNotEqual(picture.img_src, picture.external_picture)
+        self.assertEqual(picture.img_dimensions["intrinsic_width"], 800)
+        self.assertEqual(len(picture.get_missing_thumbnails()), 0)
+
+        # an unchanged picture is revalidated only
+        with mock.patch("tests.test_tasks.fetch_external", wraps=fetch_external) as fetch:
+            self.assertFalse(picture.update_external_copy())
+        fetch.assert_called_once_with("https://example.com/image.png", etag='"v1"', last_modified="")
+
+        # another URL drops the copy, unless another picture still uses it
+        copy = picture.external_file
+        other = Picture.objects.create(
+            external_picture=picture.external_picture,
+            external_url_hash=picture.external_url_hash,
+            external_file=copy,
+        )
+        picture.external_picture = "https://example.com/other.png"
+        with mock.patch.object(tasks, "generate_thumbnails"):
+            picture.save()
+        self.assertEqual((picture.external_file, picture.source_sha1), ("", ""))
+        self.assertEqual(picture.img_src, "https://example.com/other.png")
+        self.assertTrue(get_storage().exists(copy))
+        # deleting the last picture using it deletes it
+        other.delete()
+        self.assertFalse(get_storage().exists(copy))
+
+    @override_settings(
+        DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="sync",
+        DJANGOCMS_PICTURE_EXTERNAL_CACHE=True,
+        DJANGOCMS_PICTURE_EXTERNAL_FETCHER="tests.test_tasks.fetch_external",
+    )
+    def test_external_picture_copy_deleted(self):
+        for change in ("url", "removed"):
+            with self.subTest(change):
+                with self.captureOnCommitCallbacks(execute=True):
+                    picture = Picture.objects.create(external_picture="https://example.com/image.png")
+                picture.refresh_from_db()
+                copy = picture.external_file
+                self.assertTrue(get_storage().exists(copy))
+                if change == "url":
+                    picture.external_picture = "https://example.com/other.png"
+                else:
+                    picture.external_picture = ""
+                    picture.picture = self.image
+                with mock.patch.object(tasks, "generate_thumbnails"):
+                    picture.save()
+                self.assertEqual(picture.external_file, "")
+                self.assertFalse(get_storage().exists(copy))
+                picture.delete()
+
+    @override_settings(DJANGOCMS_PICTURE_THUMBNAIL_EXECUTOR="sync")
+    def test_external_picture_not_cached(self):
+        with mock.patch("tests.test_tasks.fetch_external") as fetch:
+            with self.captureOnCommitCallbacks(execute=True):
+                picture = Picture.objects.create(external_picture="https://example.com/image.png")
+        fetch.assert_not_called()
+        self.assertEqual(picture.img_src, "https://example.com/image.png")
+
+
+def enqueue(func, *args):
+    pass
+
+
+def fetch_external(url, etag="", last_modified=""):
+    if etag == '"v1"':
+        return FetchResult(304, None, etag, last_modified)
+    content = BytesIO()
+    PILImage.new("RGB", (800, 600), (200, 100, 50)).save(content, "PNG")
+    return FetchResult(200, content.getvalue(), '"v1"', "")
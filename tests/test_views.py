@@ -0,0 +1,69 @@
+from django.test import TestCase, override_settings
+
+from djangocms_picture.models import Picture
+
+from .helpers import get_filer_image
+
+
+@override_settings(DJANGOCMS_PICTURE_SERVE_THUMBNAILS=True, ROOT_URLCONF="tests.urls")
+class ThumbnailViewTestCase(TestCase):
+
+    def setUp(self):
+        self.image = get_filer_image()
+        self.picture = Picture.objects.create(picture=self.image, width=400)
+
+    def tearDown(self):
+        self.image.delete()
+
+    def test_serve_thumbnail(self):
+        url = self.picture.img_src
+        self.assertTrue(url.startswith("/picture/thumbnails/"))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        content = b"".join(response.streaming_content)
+        self.assertEqual(content[:2], b"\xff\xd8")
+        self.assertEqual(int(response["Content-Length"]), len(content))
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertFalse(etag.startswith("W/"))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, content[10:20])
+        self.assertEqual(response["Content-Range"], "bytes 10-19/{}".format(len(content)))
+        response = self.client.get(url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(response.content, content[-5:])
+        # the file changed since the partial download
+        response = self.client.get(url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_RANGE="bytes={}-".format(len(content)))
+        self.assertEqual(response.status_code, 416)
+
+    def test_replaced_image(self):
+        url = self.picture.img_src
+        self.image.sha1 = "0" * 40
+        self.image.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertNotEqual(Picture.objects.get(pk=self.picture.pk).img_src, url)
+
+    @override_settings(
+        DJANGOCMS_PICTURE_SERVE_THUMBNAILS_OFFLOAD="x-accel-redirect",
+        DJANGOCMS_PICTURE_SERVE_THUMBNAILS_OFFLOAD_PREFIX="/internal/",
+    )
+    def test_offload(self):
+        response = self.client.get(self.picture.img_src)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertRegex(response["X-Accel-Redirect"], r"^/internal/filer_public_thumbnails/.*\.jpg$")
+        self.assertIn("ETag", response)
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get("/picture/thumbnails/invalid/").status_code, 404)